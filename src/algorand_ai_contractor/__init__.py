@@ -5,13 +5,28 @@ A production-grade platform for generating, validating, and deploying
 Algorand PyTeal smart contracts using natural language and AI.
 """
 
+# core only holds the lazy-export table; its submodules, and so openai, pyteal
+# and algosdk, are imported the first time one of these names is used
+from algorand_ai_contractor import core
+
 __version__ = "0.1.0"
 __author__ = "CDNamchu"
 
-from algorand_ai_contractor.core.ai_engine import ContractGenerator, explain_contract
-from algorand_ai_contractor.core.algorand_utils import *
-
 __all__ = [
     "ContractGenerator",
     "explain_contract",
 ]
+
+
+def __getattr__(name):
+    """Resolve a public name through core's lazy-export table."""
+    if name not in core._LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(core, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the lazily exported names alongside the module's own attributes."""
+    return sorted(set(globals()) | set(core._LAZY_ATTRIBUTES))
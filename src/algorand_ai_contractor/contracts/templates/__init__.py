@@ -0,0 +1,13 @@
+"""Reusable PyTeal building blocks for contracts."""
+
+from algorand_ai_contractor.contracts.templates.common import (
+    asa_deposit_checks,
+    only_creator_after_deadline,
+    safety_checks,
+)
+
+__all__ = [
+    "asa_deposit_checks",
+    "only_creator_after_deadline",
+    "safety_checks",
+]
@@ -0,0 +1,72 @@
+"""
+Shared PyTeal building blocks for contracts.
+
+Each guard is built once per process and reused by reference, so programs
+composing the same checks do not reconstruct identical ASTs.
+"""
+
+from functools import lru_cache
+from pyteal import (
+    And, App, Assert, Bytes, Expr, Global, Gtxn, Int, Seq, Subroutine, TealType, Txn, TxnType
+)
+
+
+def _safety_asserts(fee_limit: Expr) -> Expr:
+    return Seq(
+        Assert(Txn.rekey_to() == Global.zero_address()),
+        Assert(Txn.close_remainder_to() == Global.zero_address()),
+        Assert(Txn.fee() <= fee_limit)
+    )
+
+
+@lru_cache(maxsize=None)
+def _fixed_fee_safety_checks(fee_limit: int) -> Expr:
+    @Subroutine(TealType.none, name=f"safety_checks_{fee_limit}")
+    def checks() -> Expr:
+        return _safety_asserts(Int(fee_limit))
+
+    return checks()
+
+
+@Subroutine(TealType.none, name="safety_checks_dynamic")
+def _dynamic_fee_safety_checks(fee_limit: Expr) -> Expr:
+    return _safety_asserts(fee_limit)
+
+
+def safety_checks(fee_limit: int | Expr = 1000) -> Expr:
+    """No rekeying, no close-out of the remainder, and a bounded fee.
+
+    fee_limit is a Python int (inlined as a constant) or a uint64 PyTeal
+    expression such as App.globalGet(Bytes("max_fee")), evaluated per call.
+
+    Each clause is its own Assert so a rejected transaction fails on the first
+    violated check instead of evaluating the whole conjunction. The checks are
+    emitted once as a subroutine, so every branch that runs them costs a single
+    callsub.
+    """
+    if isinstance(fee_limit, Expr):
+        return _dynamic_fee_safety_checks(fee_limit)
+    return _fixed_fee_safety_checks(fee_limit)
+
+
+@lru_cache(maxsize=None)
+def only_creator_after_deadline(deadline_key: str) -> Expr:
+    """Creator-only guard that also requires the stored deadline to have passed."""
+    return And(
+        Txn.sender() == Global.creator_address(),
+        Global.latest_timestamp() > App.globalGet(Bytes(deadline_key))
+    )
+
+
+@Subroutine(TealType.none)
+def asa_deposit_checks(asa_id: Expr) -> Expr:
+    """App call paired with a non-zero transfer of asa_id into this application."""
+    return Seq(
+        Assert(Global.group_size() == Int(2)),
+        Assert(Gtxn[0].type_enum() == TxnType.ApplicationCall),
+        Assert(Gtxn[1].type_enum() == TxnType.AssetTransfer),
+        Assert(Gtxn[1].asset_amount() > Int(0)),
+        Assert(Gtxn[1].sender() == Txn.sender()),
+        Assert(Gtxn[1].xfer_asset() == asa_id),
+        Assert(Gtxn[1].asset_receiver() == Global.current_application_address())
+    )
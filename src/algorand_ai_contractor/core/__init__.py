@@ -1,9 +1,39 @@
 """Core AI and blockchain utilities for contract generation."""
 
-from algorand_ai_contractor.core.ai_engine import ContractGenerator, explain_contract
-from algorand_ai_contractor.core.algorand_utils import *
+import importlib
 
 __all__ = [
     "ContractGenerator",
     "explain_contract",
 ]
+
+# Resolved on first access, so importing core does not load openai, pyteal
+# and algosdk until one of these is used
+_LAZY_ATTRIBUTES = {
+    "ContractGenerator": "algorand_ai_contractor.core.ai_engine",
+    "explain_contract": "algorand_ai_contractor.core.ai_engine",
+    "aexplain_contract": "algorand_ai_contractor.core.ai_engine",
+    "explain_batch": "algorand_ai_contractor.core.ai_engine",
+    "AlgorandDeployer": "algorand_ai_contractor.core.algorand_utils",
+    "compile_contracts_batch": "algorand_ai_contractor.core.algorand_utils",
+    "compile_pyteal_source": "algorand_ai_contractor.core.algorand_utils",
+    "compile_saved_contracts": "algorand_ai_contractor.core.algorand_utils",
+    "create_simple_clear_program": "algorand_ai_contractor.core.algorand_utils",
+    "fill_template_vars": "algorand_ai_contractor.core.algorand_utils",
+    "precompile_pyteal_source": "algorand_ai_contractor.core.algorand_utils",
+}
+
+
+def __getattr__(name):
+    """Import the submodule that defines a public name the first time it is used."""
+    module_path = _LAZY_ATTRIBUTES.get(name)
+    if module_path is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_path), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the lazily exported names alongside the module's own attributes."""
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -4,13 +4,30 @@ Compliance: EU AI Act Tier 2, IEEE EAD
 Supports: OpenAI GPT-4 and Perplexity AI
 """
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import os
+import re
+import asyncio
+import ast
 import json
+import time
+import queue
+import atexit
+import hashlib
 import logging
+import tempfile
+import threading
 from datetime import datetime
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
 from dotenv import load_dotenv
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import orjson  # Optional C-accelerated JSON for the cache hot path
+except ImportError:
+    orjson = None
 
 load_dotenv()
 
@@ -19,13 +36,219 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 PERPLEXITY_API_KEY = os.getenv('PERPLEXITY_API_KEY')
 AI_PROVIDER = os.getenv('AI_PROVIDER', 'perplexity')
 
-# Configure structured logging
+# Optional provider caps for concurrent async calls; unset means no throttling
+RATE_LIMIT_RPM = float(os.getenv('ALGO_AI_RPM') or 0) or None
+RATE_LIMIT_TPM = float(os.getenv('ALGO_AI_TPM') or 0) or None
+
+# Configure structured logging; file writes happen on a listener thread, off the request path
+_log_queue = queue.SimpleQueue()
+_log_file_handler = logging.FileHandler('ai_generations.log')
+_log_file_handler.setFormatter(logging.Formatter('%(asctime)s | %(levelname)s | %(message)s'))
+_log_listener = QueueListener(_log_queue, _log_file_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logging.basicConfig(
-    filename='ai_generations.log',
     level=logging.INFO,
-    format='%(asctime)s | %(levelname)s | %(message)s'
+    format='%(message)s',
+    handlers=[QueueHandler(_log_queue)]
 )
 
+# Generated source should only build PyTeal expressions; these names are rejected before it is
+# exec'd. This is a lint that catches obvious misuse, not a sandbox: it matches names only, so
+# e.g. getattr(__builtins__, "ev" + "al") gets past it
+DANGEROUS_CALLS = frozenset({
+    'eval', 'exec', 'compile', '__import__', 'open', 'input', 'breakpoint'
+})
+DANGEROUS_MODULES = frozenset({
+    'os', 'sys', 'subprocess', 'shutil', 'socket', 'importlib', 'builtins', 'ctypes', 'pickle'
+})
+
+def _is_main_guard(node: ast.AST) -> bool:
+    """True for `if __name__ == "__main__":`, whose body never runs when the source is exec'd."""
+    test = getattr(node, 'test', None)
+    return (
+        isinstance(node, ast.If)
+        and isinstance(test, ast.Compare)
+        and isinstance(test.left, ast.Name) and test.left.id == '__name__'
+        and len(test.ops) == 1 and isinstance(test.ops[0], ast.Eq)
+        and isinstance(test.comparators[0], ast.Constant)
+        and test.comparators[0].value == '__main__'
+    )
+
+
+def _nodes_outside_main_guard(tree: ast.AST) -> Iterator[ast.AST]:
+    """Like ast.walk, but skip the bodies of `if __name__ == "__main__":` blocks."""
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        yield node
+        if _is_main_guard(node):
+            pending.extend(node.orelse)
+        else:
+            pending.extend(ast.iter_child_nodes(node))
+
+
+# Perplexity model names accepted as-is; anything else falls back to 'sonar'
+PERPLEXITY_MODELS = {'sonar': 'sonar', 'sonar-pro': 'sonar-pro'}
+
+# Contract source is returned inside a fenced Markdown code block; fences must start a line
+CODE_BLOCK_PATTERN = re.compile(
+    r"^[ \t]*```(?P<lang>[\w+-]*)[ \t]*\n(?P<code>.*?)^[ \t]*```[ \t]*$",
+    re.DOTALL | re.MULTILINE
+)
+PYTHON_FENCE_LANGS = frozenset({'python', 'py'})
+
+
+def _find_code_block(text: str) -> Optional[re.Match]:
+    """The first ```python block, else the first fenced block that defines approval_program."""
+    fallback = None
+    for match in CODE_BLOCK_PATTERN.finditer(text):
+        if match.group('lang').lower() in PYTHON_FENCE_LANGS:
+            return match
+        if fallback is None and 'approval_program' in match.group('code'):
+            fallback = match
+    return fallback
+
+# Successful AI responses are cached on disk, keyed by everything sent to the model
+PROMPT_CACHE_PATH = Path(os.getenv(
+    'PROMPT_CACHE_DIR', Path(__file__).parent.parent.parent.parent / "outputs" / "prompts"
+))
+
+
+def _prompt_cache_key(*parts: str) -> str:
+    """Hash the provider, model, prompts and user input of a request."""
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _normalize_prompt(text: str) -> str:
+    """
+    Collapse whitespace so requests differing only in spacing share a cache entry.
+
+    Case is kept: state keys, unit names and method selectors are case-sensitive.
+    """
+    return ' '.join(text.split())
+
+
+def _json_dumps(obj: Dict) -> bytes:
+    """Serialize to UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _json_loads(data: bytes) -> Dict:
+    """Parse UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _read_prompt_cache(key: str) -> Optional[Dict]:
+    """Return a cached response, or None on a miss or unreadable entry."""
+    try:
+        return _json_loads((PROMPT_CACHE_PATH / f"{key}.json").read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_prompt_cache(key: str, payload: Dict) -> None:
+    """Atomically persist a response; a failed write only costs a repeat API call."""
+    try:
+        PROMPT_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=PROMPT_CACHE_PATH, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_json_dumps(payload))
+        os.replace(tmp_path, PROMPT_CACHE_PATH / f"{key}.json")
+    except OSError as e:
+        logging.warning(f"Could not cache AI response: {e}")
+
+
+@lru_cache(maxsize=None)
+def _shared_client(provider: str) -> OpenAI:
+    """Build one OpenAI client per provider so its connection pool is reused."""
+    if provider == 'perplexity':
+        return OpenAI(
+            api_key=PERPLEXITY_API_KEY,
+            base_url="https://api.perplexity.ai"
+        )
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+
+class _TokenBucket:
+    """Requests- and tokens-per-minute budget shared by every async API call in the process."""
+
+    def __init__(self, rpm: Optional[float], tpm: Optional[float]):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = rpm or 0.0
+        self._tokens = tpm or 0.0
+        self._updated = time.monotonic()
+        # Streamlit sessions each run their own event loop on their own thread
+        self._lock = threading.Lock()
+
+    def _try_take(self, tokens: float) -> bool:
+        """Refill for the time elapsed, then take one request and `tokens` if both are available."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            if self.rpm:
+                self._requests = min(self.rpm, self._requests + self.rpm * elapsed / 60)
+                if self._requests < 1:
+                    return False
+            if self.tpm:
+                self._tokens = min(self.tpm, self._tokens + self.tpm * elapsed / 60)
+                if self._tokens < tokens:
+                    return False
+            self._requests -= 1
+            self._tokens -= tokens
+            return True
+
+    async def acquire(self, tokens: float):
+        """Wait until the call fits under both caps."""
+        if not (self.rpm or self.tpm):
+            return
+        # A call larger than the whole bucket could never run, so it waits for a full one
+        tokens = min(tokens, self.tpm or tokens)
+        while not self._try_take(tokens):
+            await asyncio.sleep(0.05)
+
+
+_rate_limiter = _TokenBucket(RATE_LIMIT_RPM, RATE_LIMIT_TPM)
+
+
+def _estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Rough prompt size (4 characters per token) plus the completion budget."""
+    return sum(len(message['content']) for message in messages) // 4 + max_tokens
+
+
+def _async_http_client():
+    """
+    aiohttp transport when openai's `aiohttp` extra is installed, else None for the httpx default.
+
+    Only pass the result straight to AsyncOpenAI, whose close() also closes this session.
+    """
+    try:
+        from openai import DefaultAioHttpClient
+        return DefaultAioHttpClient()
+    except (ImportError, RuntimeError):
+        return None
+
+
+def _new_async_client(provider: str) -> AsyncOpenAI:
+    """
+    Build an AsyncOpenAI client for one event loop; the caller must close it.
+
+    Its pool is tied to the running loop, so it is not shared across calls.
+    """
+    if provider == 'perplexity':
+        return AsyncOpenAI(
+            api_key=PERPLEXITY_API_KEY,
+            base_url="https://api.perplexity.ai",
+            http_client=_async_http_client()
+        )
+    return AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=_async_http_client())
+
 
 class ContractGenerator:
     """Deterministic PyTeal code generator with self-correction loop."""
@@ -47,48 +270,101 @@ YOU HAVE ACCESS TO REAL-TIME WEB SEARCH (if using Perplexity). If you need to ve
    - Integer overflow risks
 6. Always include proper fee checks and transaction validation
 7. Use defensive programming patterns
+8. The source is checked before it is compiled: outside an `if __name__ == "__main__":` block,
+   do not call `eval`, `exec`, `compile`, `__import__`, `open`, `input` or `breakpoint`, and do
+   not import `os`, `sys`, `subprocess`, `shutil`, `socket`, `importlib`, `builtins`, `ctypes`
+   or `pickle`
+
+*PERFORMANCE GUIDELINES:*
+- Target TEAL v8: the deployer compiles `approval_program` with `version=8`, so any `compileTeal`
+  call you include must also use `version=8`
+- Import only the PyTeal names the contract uses (`from pyteal import Seq, Assert, ...`), not
+  `from pyteal import *`
+- Use short constant `Bytes(...)` state keys; never build keys at runtime with `Concat`/`Itob` when
+  the set of keys is bounded (local state is already per-app, so never suffix keys with the app id)
+- Fold constant arithmetic in Python, inside one literal (`Int(7 * 24 * 60 * 60)`), never as PyTeal
+  operators on literals (`Int(86400) * Int(7)`), which emit runtime opcodes
+- Dispatch with a single flat `Cond`, not nested `Cond`/`If` chains. List the creation branch
+  (`Txn.application_id() == Int(0)`) and the argument-less `OnCompletion` branches (OptIn,
+  CloseOut, UpdateApplication, DeleteApplication) first, then the NoOp method branches that test
+  `Txn.application_args[0]`. `And` compiles to TEAL `&&`, which evaluates every operand, so a
+  branch reading `Txn.application_args[0]` panics on calls without arguments even when its
+  `Txn.on_completion()` test is false; a `Txn.application_args.length()` check inside the same
+  `And` does not prevent this
+- Read each `App.globalGet`/`App.localGet` value once into a `ScratchVar` when a branch uses it more
+  than once, and write counters back from it (`App.globalPut(key, total.load() + Int(1))`)
+- Use `App.localGet`/`App.globalGet` (missing keys read as zero) instead of
+  `localGetEx`/`globalGetEx` unless the key's existence itself matters
+- Take per-deployment constants (owner addresses, durations) as
+  `Tmpl.Addr("TMPL_OWNER1")`/`Tmpl.Int("TMPL_DURATION")` rather than literals, so one compiled
+  program serves every deployment
+- Bound fees with a single `Txn.fee() <= Int(...)` check; PyTeal has no `Txn.flat_fee()`
+- Handle opt-in with a bare `Approve()`; do not zero-initialize local keys, since `App.localGet`
+  already reads missing keys as zero
+- Omit `App.optedIn(...)` checks in branches that `App.localPut` to the sender; the write already
+  fails for accounts that have not opted in
+- Keep per-item counters (e.g. votes per option) in one box via `App.box_extract`/`App.box_replace`
+  at fixed 8-byte offsets, not one global key per item
+- Express guards as a sequence of `Assert(...)` statements rather than one large `And(...)`, so
+  rejects fail on the first violated check; order them cheapest first (group size and `Txn`/`Gtxn`
+  fields, then local state, then global state)
+- Wrap blocks repeated across branches (shared guards, the same `App.localGet(Int(0), key)` read) in
+  a `@Subroutine`
+- Reuse this project's shared guards rather than rewriting them, via
+  `from algorand_ai_contractor.contracts.templates import safety_checks, asa_deposit_checks,
+  only_creator_after_deadline`:
+  - `safety_checks(fee_limit)`: no rekey, no close-remainder and `Txn.fee() <= fee_limit`,
+    emitted once as a subroutine, so each use is one `callsub`; `fee_limit` is a Python `int`
+    (default 1000) or a uint64 PyTeal expression such as `App.globalGet(Bytes("max_fee"))`
+  - `asa_deposit_checks(asa_id)`: a 2-transaction group whose second transaction moves a non-zero
+    amount of `asa_id` from the caller to this application
+  - `only_creator_after_deadline("key")`: true for the creator once `Global.latest_timestamp()`
+    exceeds the global uint stored at `key`
+- Declare loop counters and bounds as `ScratchVar`s before the loop and store the bound once:
+  `For(i.store(Int(0)), i.load() < n.load(), i.store(i.load() + Int(1))).Do(...)`
 
 *OUTPUT STRUCTURE:*
-1. Complete PyTeal source code
+1. Complete PyTeal source code in a single ```python fenced block
 2. Contract purpose summary (2-3 sentences)
 3. Logic walkthrough (key conditions and branches)
 4. Security considerations
 5. Deployment parameters needed
 """
 
-    def __init__(self, model: str = "sonar", temperature: float = 0.2):
+    def __init__(
+        self,
+        model: str = "sonar",
+        temperature: float = 0.2,
+        ai_provider: Optional[str] = None
+    ):
         self.model = model
         self.temperature = temperature
         self.generation_history = []
-        self.ai_provider = AI_PROVIDER
+        self.ai_provider = ai_provider or AI_PROVIDER
         self.client = None
+        self._system_message = {"role": "system", "content": self.SYSTEM_PROMPT}
 
     def _get_client(self, provider: str) -> OpenAI:
         """Get configured OpenAI client for different providers."""
-        if provider == 'perplexity':
-            return OpenAI(
-                api_key=PERPLEXITY_API_KEY,
-                base_url="https://api.perplexity.ai"
-            )
-        return OpenAI(api_key=OPENAI_API_KEY)
+        return _shared_client(provider)
+
+    def _get_async_client(self, provider: str) -> AsyncOpenAI:
+        """Get a new AsyncOpenAI client for the provider; the caller must close it."""
+        return _new_async_client(provider)
 
     def _get_model(self, provider: str, model: str) -> str:
         """Get appropriate model name for provider - uses correct Perplexity model names."""
         if provider == 'perplexity':
-            if model in ['sonar', 'sonar-pro']:
-                return model
-            return 'sonar'
-        else:  # openai
-            if not model.startswith('gpt'):
-                return "gpt-4"
-        return model
+            return PERPLEXITY_MODELS.get(model, 'sonar')
+        return model if model.startswith('gpt') else 'gpt-4'
 
     def generate_pyteal_contract(
         self,
         description: str,
         max_retries: int = 3,
         ai_provider: Optional[str] = None,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        use_cache: bool = True
     ) -> Dict[str, str]:
         """
         Generate PyTeal contract with automatic validation and retry.
@@ -98,12 +374,20 @@ YOU HAVE ACCESS TO REAL-TIME WEB SEARCH (if using Perplexity). If you need to ve
             max_retries: Maximum retry attempts
             ai_provider: 'perplexity' or 'openai' (overrides default)
             model: Specific model to use (overrides default)
+            use_cache: Reuse a previous successful generation for the same request
 
         Returns:
             Dict with keys: code, explanation, deployment, audit
         """
         provider = ai_provider or self.ai_provider
         selected_model = self._get_model(provider, model or self.model)
+
+        cache_key = self._generation_cache_key(provider, selected_model, description)
+        if use_cache:
+            cached = self._read_cached_generation(cache_key, description)
+            if cached is not None:
+                return cached
+
         client = self._get_client(provider)
 
         attempt = 0
@@ -119,14 +403,15 @@ YOU HAVE ACCESS TO REAL-TIME WEB SEARCH (if using Perplexity). If you need to ve
                 response = client.chat.completions.create(
                     model=selected_model,
                     messages=[
-                        {"role": "system", "content": self.SYSTEM_PROMPT},
+                        self._system_message,
                         {"role": "user", "content": self._build_user_prompt(description, last_error)}
                     ],
                     temperature=self.temperature,
-                    max_tokens=2000
+                    max_tokens=2000,
+                    stream=True
                 )
 
-                raw_output = response.choices[0].message.content
+                raw_output = self._collect_stream(response)
                 parsed = self._parse_ai_response(raw_output)
                 validation_result = self._validate_pyteal_syntax(parsed['code'])
 
@@ -134,19 +419,9 @@ YOU HAVE ACCESS TO REAL-TIME WEB SEARCH (if using Perplexity). If you need to ve
                     self._log_generation(
                         description, parsed, attempt + 1, provider, selected_model
                     )
-                    return {
-                        'success': True,
-                        'code': parsed['code'],
-                        'explanation': parsed['explanation'],
-                        'deployment': parsed['deployment'],
-                        'audit': parsed['audit'],
-                        'metadata': {
-                            'model': selected_model,
-                            'provider': provider,
-                            'attempts': attempt + 1,
-                            'timestamp': datetime.utcnow().isoformat()
-                        }
-                    }
+                    result = self._build_result(parsed, attempt + 1, provider, selected_model)
+                    _write_prompt_cache(cache_key, result)
+                    return result
 
                 last_error = validation_result['error']
                 attempt += 1
@@ -163,6 +438,223 @@ YOU HAVE ACCESS TO REAL-TIME WEB SEARCH (if using Perplexity). If you need to ve
             'partial_code': None
         }
 
+    def stream_pyteal_contract(
+        self,
+        description: str,
+        ai_provider: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Yield the model's response text as it is generated, for live display.
+
+        Pass the joined text to finalize_streamed_contract() to validate it.
+        """
+        provider = ai_provider or self.ai_provider
+        selected_model = self._get_model(provider, model or self.model)
+
+        stream = self._get_client(provider).chat.completions.create(
+            model=selected_model,
+            messages=[
+                self._system_message,
+                {"role": "user", "content": self._build_user_prompt(description)}
+            ],
+            temperature=self.temperature,
+            max_tokens=2000,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def finalize_streamed_contract(
+        self,
+        description: str,
+        raw_output: str,
+        ai_provider: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, str]:
+        """
+        Validate a response produced by stream_pyteal_contract().
+
+        Returns:
+            Same dict as generate_pyteal_contract()
+        """
+        provider = ai_provider or self.ai_provider
+        selected_model = self._get_model(provider, model or self.model)
+
+        parsed = self._parse_ai_response(raw_output)
+        validation_result = self._validate_pyteal_syntax(parsed['code'])
+        if not validation_result['valid']:
+            logging.warning(f"Validation failed: {validation_result['error']}")
+            return {
+                'success': False,
+                'error': validation_result['error'],
+                'partial_code': parsed['code']
+            }
+
+        self._log_generation(description, parsed, 1, provider, selected_model)
+        result = self._build_result(parsed, 1, provider, selected_model)
+        cache_key = self._generation_cache_key(provider, selected_model, description)
+        _write_prompt_cache(cache_key, result)
+        return result
+
+    def _collect_stream(self, stream) -> str:
+        """
+        Accumulate a streamed completion.
+
+        The code block is validated as soon as its closing fence arrives; if it
+        is invalid the stream is closed so the retry starts without waiting for
+        the trailing explanation.
+        """
+        chunks = []
+        code_checked = False
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            chunks.append(delta)
+            if not code_checked and '`' in delta:
+                # Only a ```python block is final here; other blocks may precede it
+                match = next((
+                    block for block in CODE_BLOCK_PATTERN.finditer(''.join(chunks))
+                    if block.group('lang').lower() in PYTHON_FENCE_LANGS
+                ), None)
+                if match is not None:
+                    code_checked = True
+                    if not self._validate_pyteal_syntax(match.group('code'))['valid']:
+                        stream.close()
+                        break
+        return ''.join(chunks)
+
+    async def agenerate_pyteal_contract(
+        self,
+        description: str,
+        max_retries: int = 3,
+        ai_provider: Optional[str] = None,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        max_concurrent: int = 4
+    ) -> Dict[str, str]:
+        """
+        Generate PyTeal contract by racing max_retries attempts in parallel.
+
+        Each attempt runs at a slightly higher temperature; the first response
+        that passes validation wins and the others are cancelled. Failed
+        attempts are not fed back as corrections, so this trades extra API
+        calls for roughly one round-trip of latency. At most max_concurrent
+        requests are in flight at once, to stay inside provider rate limits.
+
+        Returns:
+            Same dict as generate_pyteal_contract()
+        """
+        provider = ai_provider or self.ai_provider
+        selected_model = self._get_model(provider, model or self.model)
+
+        cache_key = self._generation_cache_key(provider, selected_model, description)
+        if use_cache:
+            cached = self._read_cached_generation(cache_key, description)
+            if cached is not None:
+                return cached
+
+        client = self._get_async_client(provider)
+        messages = [
+            self._system_message,
+            {"role": "user", "content": self._build_user_prompt(description)}
+        ]
+        logging.info(
+            f"Racing {max_retries} generation attempts for: "
+            f"{description[:100]} using {provider}/{selected_model}"
+        )
+        semaphore = asyncio.Semaphore(max_concurrent)
+        estimated_tokens = _estimate_tokens(messages, 2000)
+
+        async def request(temperature: float):
+            async with semaphore:
+                await _rate_limiter.acquire(estimated_tokens)
+                return await client.chat.completions.create(
+                    model=selected_model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=2000
+                )
+
+        tasks = [
+            asyncio.ensure_future(request(min(self.temperature + 0.1 * i, 1.0)))
+            for i in range(max_retries)
+        ]
+
+        last_error = None
+        try:
+            for attempt, next_response in enumerate(asyncio.as_completed(tasks), start=1):
+                try:
+                    response = await next_response
+                    parsed = self._parse_ai_response(response.choices[0].message.content)
+                    validation_result = self._validate_pyteal_syntax(parsed['code'])
+
+                    if validation_result['valid']:
+                        self._log_generation(description, parsed, attempt, provider, selected_model)
+                        result = self._build_result(parsed, attempt, provider, selected_model)
+                        _write_prompt_cache(cache_key, result)
+                        return result
+
+                    last_error = validation_result['error']
+                    logging.warning(f"Validation failed: {last_error}")
+
+                except Exception as e:
+                    last_error = str(e)
+                    logging.error(f"Generation error: {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let cancelled requests unwind before their client's pool is closed
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await client.close()
+
+        return {
+            'success': False,
+            'error': f"Failed after {max_retries} attempts. Last error: {last_error}",
+            'partial_code': None
+        }
+
+    def _generation_cache_key(self, provider: str, model: str, description: str) -> str:
+        """Key a generation by everything that shapes the model's output."""
+        return _prompt_cache_key(
+            provider, model, str(self.temperature), self.SYSTEM_PROMPT,
+            _normalize_prompt(description)
+        )
+
+    def _read_cached_generation(self, cache_key: str, description: str) -> Optional[Dict]:
+        """Return a previous successful generation, marked as cached."""
+        cached = _read_prompt_cache(cache_key)
+        if cached is not None:
+            logging.info(f"Prompt cache hit for: {description[:100]}")
+            cached['metadata']['cached'] = True
+        return cached
+
+    def _build_result(
+        self,
+        parsed: Dict[str, str],
+        attempts: int,
+        provider: str,
+        model: str
+    ) -> Dict:
+        """Assemble the success payload returned to callers and cached."""
+        return {
+            'success': True,
+            'code': parsed['code'],
+            'explanation': parsed['explanation'],
+            'deployment': parsed['deployment'],
+            'audit': parsed['audit'],
+            'metadata': {
+                'model': model,
+                'provider': provider,
+                'attempts': attempts,
+                'timestamp': datetime.utcnow().isoformat()
+            }
+        }
+
     def _build_user_prompt(self, description: str, previous_error: str = None) -> str:
         """Construct user prompt with self-correction context."""
         base = f"""Generate a PyTeal smart contract for the following requirement:
@@ -179,19 +671,46 @@ PREVIOUS ATTEMPT FAILED WITH ERROR:
         return base
 
     def _parse_ai_response(self, raw_output: str) -> Dict[str, str]:
-        """Dummy parser for AI response (to be implemented)."""
+        """Split AI response into the fenced contract code and surrounding prose."""
+        match = _find_code_block(raw_output)
+        if match is None:
+            return {
+                "code": raw_output,
+                "explanation": "",
+                "deployment": "",
+                "audit": ""
+            }
         return {
-            "code": raw_output,
-            "explanation": "",
+            "code": match.group('code'),
+            "explanation": (raw_output[:match.start()] + raw_output[match.end():]).strip(),
             "deployment": "",
             "audit": ""
         }
 
     def _validate_pyteal_syntax(self, code: str) -> Dict[str, str]:
-        """Simple syntax validation placeholder."""
-        if "approval_program" in code:
-            return {"valid": True}
-        return {"valid": False, "error": "Missing approval program definition."}
+        """Check the code parses as Python and defines an approval program."""
+        if "approval_program" not in code:
+            return {"valid": False, "error": "Missing approval program definition."}
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            return {"valid": False, "error": f"Python syntax error on line {e.lineno}: {e.msg}"}
+        # Contract source is exec'd at compile time, so flag anything beyond building PyTeal
+        for node in _nodes_outside_main_guard(tree):
+            if isinstance(node, ast.Call) and getattr(node.func, 'id', None) in DANGEROUS_CALLS:
+                error = f"Disallowed call to {node.func.id}() on line {node.lineno}."
+                return {"valid": False, "error": error}
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                modules = [node.module or '']
+            else:
+                continue
+            for module in modules:
+                if module.split('.')[0] in DANGEROUS_MODULES:
+                    error = f"Disallowed import of {module} on line {node.lineno}."
+                    return {"valid": False, "error": error}
+        return {"valid": True}
 
     def _log_generation(
         self,
@@ -203,60 +722,130 @@ PREVIOUS ATTEMPT FAILED WITH ERROR:
     ) -> None:
         """Log successful generations to file."""
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+            # Epoch seconds; the log line itself carries a readable time
+            "timestamp": round(time.time(), 3),
             "description": description,
             "attempt": attempt,
             "provider": provider,
             "model": model,
             "code_snippet": parsed['code'][:200]
         }
-        logging.info(json.dumps(log_entry, indent=2))
+        logging.info(_json_dumps(log_entry).decode('utf-8'))
 
 
 # ---------------------------------------------------------------------
 # Add-on utility function for contract explanation
 # ---------------------------------------------------------------------
 
+def _explain_messages(code: str) -> list:
+    """Chat messages asking for a stakeholder-level explanation of a contract."""
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You are an expert at explaining blockchain smart contracts in simple terms. "
+                "Provide a clear, non-technical summary suitable for business stakeholders."
+            )
+        },
+        {
+            "role": "user",
+            "content": (
+                f"Explain this PyTeal smart contract:\n\n{code}\n\n"
+                "Include: purpose, key operations, user interactions, and risks."
+            )
+        }
+    ]
+
+
 def explain_contract(code: str, ai_provider: Optional[str] = None) -> str:
     """
     Use AI to provide human-readable explanation of existing PyTeal code.
     """
     try:
         provider = ai_provider or AI_PROVIDER
+        model = "sonar" if provider == 'perplexity' else "gpt-4"
 
-        if provider == 'perplexity':
-            client = OpenAI(
-                api_key=PERPLEXITY_API_KEY,
-                base_url="https://api.perplexity.ai"
-            )
-            model = "sonar"  # Use latest sonar model
-        else:
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            model = "gpt-4"
+        cache_key = _prompt_cache_key('explain', provider, model, code)
+        cached = _read_prompt_cache(cache_key)
+        if cached is not None:
+            return cached['explanation']
+
+        client = _shared_client(provider)
 
         response = client.chat.completions.create(
             model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an expert at explaining blockchain smart contracts in simple terms. "
-                        "Provide a clear, non-technical summary suitable for business stakeholders."
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": (
-                        f"Explain this PyTeal smart contract:\n\n{code}\n\n"
-                        "Include: purpose, key operations, user interactions, and risks."
-                    )
-                }
-            ],
+            messages=_explain_messages(code),
             temperature=0.3,
             max_tokens=800
         )
-        return response.choices[0].message.content
+        explanation = response.choices[0].message.content
+        _write_prompt_cache(cache_key, {'explanation': explanation})
+        return explanation
 
     except Exception as e:
         logging.error(f"Explanation generation failed: {e}")
         return f"Error generating explanation: {str(e)}"
+
+
+async def aexplain_contract(
+    code: str,
+    ai_provider: Optional[str] = None,
+    client: Optional[AsyncOpenAI] = None
+) -> str:
+    """
+    Async variant of explain_contract(); pass client to share one across calls.
+    """
+    try:
+        provider = ai_provider or AI_PROVIDER
+        model = "sonar" if provider == 'perplexity' else "gpt-4"
+
+        cache_key = _prompt_cache_key('explain', provider, model, code)
+        cached = _read_prompt_cache(cache_key)
+        if cached is not None:
+            return cached['explanation']
+
+        # Close the client only if it was created here, not one shared by the caller
+        owned_client = None if client else _new_async_client(provider)
+        client = client or owned_client
+        messages = _explain_messages(code)
+
+        try:
+            await _rate_limiter.acquire(_estimate_tokens(messages, 800))
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=800
+            )
+        finally:
+            if owned_client is not None:
+                await owned_client.close()
+        explanation = response.choices[0].message.content
+        _write_prompt_cache(cache_key, {'explanation': explanation})
+        return explanation
+
+    except Exception as e:
+        logging.error(f"Explanation generation failed: {e}")
+        return f"Error generating explanation: {str(e)}"
+
+
+async def explain_batch(
+    codes: List[str],
+    ai_provider: Optional[str] = None,
+    max_concurrent: int = 8
+) -> List[str]:
+    """
+    Explain several contracts concurrently, returning explanations in input order.
+
+    At most max_concurrent requests are in flight at once, and ALGO_AI_RPM /
+    ALGO_AI_TPM cap the request and token rate when set.
+    """
+    provider = ai_provider or AI_PROVIDER
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async with _new_async_client(provider) as client:
+        async def explain(code: str) -> str:
+            async with semaphore:
+                return await aexplain_contract(code, provider, client)
+
+        return await asyncio.gather(*(explain(code) for code in codes))
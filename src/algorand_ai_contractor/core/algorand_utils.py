@@ -4,15 +4,42 @@ Supports compilation, simulation, and deployment
 """
 
 import os
+import re
+import ast
 import base64
+import hashlib
+import inspect
+import signal
+import time
 import logging
-from typing import Dict, Optional
-from algosdk import account, mnemonic
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from algosdk import account, encoding, mnemonic
+from algosdk.logic import get_application_address
 from algosdk.v2client import algod
 from algosdk.transaction import ApplicationCreateTxn, OnComplete, StateSchema, wait_for_confirmation
-from pyteal import compileTeal, Mode, Approve
+from pyteal import compileTeal, Expr, Mode, Approve, OptimizeOptions, Router
 from dotenv import load_dotenv
 
+__all__ = [
+    "AlgorandDeployer",
+    "compile_contracts_batch",
+    "compile_pyteal_source",
+    "compile_saved_contracts",
+    "create_simple_clear_program",
+    "fill_template_vars",
+    "precompile_pyteal_source",
+    "COMPILE_TIMEOUT_SECONDS",
+    "TEAL_CACHE_PATH",
+    "TEAL_VERSION",
+]
+
 load_dotenv()
 
 logging.basicConfig(
@@ -21,10 +48,357 @@ logging.basicConfig(
     format='%(asctime)s | %(levelname)s | %(message)s'
 )
 
+# Compiled TEAL is cached on disk, keyed by source and compiler settings
+TEAL_CACHE_PATH = Path(
+    os.getenv('TEAL_CACHE_DIR', Path(__file__).parent.parent.parent.parent / "outputs" / "teal")
+)
+TEAL_VERSION = 8
+TEAL_OPTIMIZATIONS = {'scratch_slots': True, 'frame_pointers': True}
+TEAL_ASSEMBLE_CONSTANTS = True
+
+try:
+    PYTEAL_VERSION = metadata.version('pyteal')
+except metadata.PackageNotFoundError:
+    PYTEAL_VERSION = 'unknown'
+
+# PyTeal keeps process-wide counters (scratch slots, subroutines), so compiles are serialized
+_COMPILE_LOCK = threading.Lock()
+# Generated code is untrusted and may loop or block; neither a lock wait nor a compile
+# is allowed to stall other sessions for longer than this
+COMPILE_TIMEOUT_SECONDS = 30
+# Generated code imports these shared guards, so their source is part of the TEAL cache key
+TEMPLATES_PATH = Path(__file__).parent.parent / "contracts" / "templates"
+PROGRAM_NAMES = ('approval_program', 'router', 'app')
+TEMPLATE_VAR_PATTERN = re.compile(r"\bTMPL_[A-Z0-9_]+\b")
+# A placeholder's TEAL type comes from the constant opcode that loads it
+TEMPLATE_INT_OPCODES = frozenset({'int', 'pushint', 'pushints', 'intcblock'})
+TEMPLATE_BYTES_OPCODES = frozenset({'byte', 'pushbytes', 'pushbytess', 'bytecblock', 'addr'})
+
+
+@lru_cache(maxsize=None)
+def _templates_fingerprint() -> str:
+    """Hash the shared template sources once per process."""
+    digest = hashlib.sha256()
+    for path in sorted(TEMPLATES_PATH.glob('*.py')):
+        digest.update(path.name.encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _teal_cache_key(pyteal_code: str, mode: Mode, version: int) -> str:
+    """Hash everything that influences the emitted TEAL."""
+    fingerprint = (
+        f"{PYTEAL_VERSION}|{_templates_fingerprint()}|{mode.name}|{version}|"
+        f"{sorted(TEAL_OPTIMIZATIONS.items())}|{TEAL_ASSEMBLE_CONSTANTS}|{pyteal_code}"
+    )
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+
+def _compile_teal(program: Expr, mode: Mode, version: int = TEAL_VERSION) -> str:
+    """Run compileTeal with the project's optimizer and constant-block settings."""
+    if isinstance(program, Router):
+        # Deployments pair the approval program with create_simple_clear_program()
+        approval_teal, _, _ = program.compile_program(
+            version=version,
+            assemble_constants=TEAL_ASSEMBLE_CONSTANTS,
+            optimize=OptimizeOptions(**TEAL_OPTIMIZATIONS)
+        )
+        return approval_teal
+    return compileTeal(
+        program, mode, version=version,
+        assembleConstants=TEAL_ASSEMBLE_CONSTANTS,
+        optimize=OptimizeOptions(**TEAL_OPTIMIZATIONS)
+    )
+
+
+def _write_cached_teal(cache_file: Path, teal_code: str) -> None:
+    """Atomically persist compiled TEAL; a failed write only costs a recompile later."""
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(teal_code)
+        os.replace(tmp_path, cache_file)
+    except OSError as e:
+        logging.warning(f"Could not cache compiled TEAL: {e}")
+
+
+@lru_cache(maxsize=128)
+def compile_pyteal_source(
+    pyteal_code: str,
+    mode: Mode = Mode.Application,
+    version: int = TEAL_VERSION
+) -> str:
+    """
+    Compile PyTeal source to TEAL, reusing a previously cached result when available.
+
+    Results are memoized in-process and persisted to TEAL_CACHE_PATH, so only
+    the first compile of a given source across runs pays the PyTeal cost.
+
+    Raises:
+        SyntaxError: If the source is not valid Python
+        ValueError: If the source does not define a PyTeal program
+        TimeoutError: If another compile holds the lock past COMPILE_TIMEOUT_SECONDS
+    """
+    cache_file = TEAL_CACHE_PATH / f"{_teal_cache_key(pyteal_code, mode, version)}.teal"
+    try:
+        return cache_file.read_text(encoding='utf-8')
+    except OSError:
+        pass
+
+    if not _COMPILE_LOCK.acquire(timeout=COMPILE_TIMEOUT_SECONDS):
+        raise TimeoutError('Another contract is still compiling; try again shortly')
+    try:
+        # A background precompile may have finished while we waited
+        try:
+            return cache_file.read_text(encoding='utf-8')
+        except OSError:
+            pass
+        teal_code = _exec_and_compile(pyteal_code, mode, version)
+        _write_cached_teal(cache_file, teal_code)
+        return teal_code
+    finally:
+        _COMPILE_LOCK.release()
+
+
+def _exec_and_compile(pyteal_code: str, mode: Mode, version: int) -> str:
+    """Execute PyTeal source and compile the program it defines."""
+    # Create temporary namespace for exec
+    namespace = {}
+
+    # Execute PyTeal code to get program; tracebacks name the generated contract
+    exec(compile(pyteal_code, '<ai_contract>', 'exec'), namespace)
+
+    # Look for approval_program or router
+    approval_program = None
+    for name in PROGRAM_NAMES:
+        candidate = namespace.get(name)
+        if inspect.isfunction(candidate):
+            # The usual PyTeal idiom: def approval_program(): return Seq(...)
+            candidate = candidate()
+        if isinstance(candidate, (Expr, Router)):
+            approval_program = candidate
+            break
+
+    if approval_program is None:
+        raise ValueError('No PyTeal program found. Ensure you define approval_program variable.')
+
+    return _compile_teal(approval_program, mode, version)
+
+
+def _raise_compile_timeout(signum, frame):
+    raise TimeoutError(f'Compile exceeded {COMPILE_TIMEOUT_SECONDS}s')
+
+
+def _precompile_to_cache(pyteal_code: str, mode: Mode, version: int, cache_file: Path) -> None:
+    """Compile into the TEAL cache; runs inside the precompile worker process."""
+    if cache_file.exists():
+        return
+    # Worker tasks run on the process's main thread, so an alarm can interrupt a runaway module
+    has_alarm = hasattr(signal, 'SIGALRM')
+    if has_alarm:
+        signal.signal(signal.SIGALRM, _raise_compile_timeout)
+        signal.alarm(COMPILE_TIMEOUT_SECONDS)
+    try:
+        teal_code = _exec_and_compile(pyteal_code, mode, version)
+    finally:
+        if has_alarm:
+            signal.alarm(0)
+    _write_cached_teal(cache_file, teal_code)
+
+
+@lru_cache(maxsize=None)
+def _precompile_executor() -> ProcessPoolExecutor:
+    """Single spawned worker for background precompiles, started on first use."""
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+
+
+def precompile_pyteal_source(
+    pyteal_code: str,
+    mode: Mode = Mode.Application,
+    version: int = TEAL_VERSION
+) -> Future:
+    """
+    Compile PyTeal source in the background to warm the TEAL cache.
+
+    A later compile_pyteal_source() call for the same source then reads the
+    cached TEAL instead of paying the compile cost on the critical path. The
+    source is executed in a separate worker process, not under _COMPILE_LOCK,
+    and is abandoned after COMPILE_TIMEOUT_SECONDS, so a looping or blocking
+    module cannot stall compiles in this process.
+    """
+    cache_file = TEAL_CACHE_PATH / f"{_teal_cache_key(pyteal_code, mode, version)}.teal"
+    return _precompile_executor().submit(
+        _precompile_to_cache, pyteal_code, mode, version, cache_file
+    )
+
+
+def _template_var_types(teal_code: str) -> Dict[str, str]:
+    """Map each TMPL_* name to 'int' or 'bytes' from the opcodes that load it."""
+    types = {}
+    for line in teal_code.splitlines():
+        opcode = line.split(None, 1)[0] if line.strip() else ''
+        if opcode in TEMPLATE_INT_OPCODES:
+            kind = 'int'
+        elif opcode in TEMPLATE_BYTES_OPCODES:
+            kind = 'bytes'
+        else:
+            # e.g. `intc_0 // TMPL_X`: the name only appears in a comment
+            continue
+        for name in TEMPLATE_VAR_PATTERN.findall(line.split('//', 1)[0]):
+            if types.setdefault(name, kind) != kind:
+                raise ValueError(f"{name} is used as both an int and a byte string")
+    return types
+
+
+def _template_literal(name: str, value, kind: str) -> str:
+    """Render a template value as a TEAL literal of the placeholder's type, or raise ValueError."""
+    if kind == 'int':
+        # Text input is accepted only as a plain decimal number
+        if isinstance(value, str) and re.fullmatch(r"[0-9]+", value):
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value < 2 ** 64:
+            raise ValueError(f"{name} needs a uint64 value, got {value!r}")
+        return str(value)
+    if isinstance(value, str):
+        # Tmpl.Addr compiles to a byte constant, so addresses go in as their 32-byte key
+        if encoding.is_valid_address(value):
+            value = encoding.decode_address(value)
+        else:
+            value = value.encode()
+    if not isinstance(value, bytes):
+        raise ValueError(f"{name} needs a byte string or address, got {value!r}")
+    return '0x' + value.hex()
+
+
+def fill_template_vars(teal_code: str, template_values: Optional[Dict] = None) -> str:
+    """
+    Substitute Tmpl.* placeholders (TMPL_*) in compiled TEAL.
+
+    The cached TEAL stays generic, so one compile serves every deployment;
+    only this string substitution runs per deployment. Each value must fit
+    its placeholder's TEAL type (decimal text is accepted for ints); a
+    mismatch raises ValueError rather than being coerced.
+    """
+    template_values = template_values or {}
+    types = _template_var_types(teal_code)
+    missing = sorted(set(TEMPLATE_VAR_PATTERN.findall(teal_code)) - set(template_values))
+    if missing:
+        raise ValueError(f"Missing template values: {', '.join(missing)}")
+    literals = {
+        name: _template_literal(name, template_values[name], kind) for name, kind in types.items()
+    }
+    filled = []
+    for line in teal_code.splitlines(keepends=True):
+        if TEMPLATE_VAR_PATTERN.search(line):
+            # `addr` takes a base32 address, so a filled-in Tmpl.Addr loads as hex bytes instead
+            line = re.sub(r"^(\s*)addr\b", r"\1byte", line)
+            line = TEMPLATE_VAR_PATTERN.sub(lambda m: literals.get(m.group(0), m.group(0)), line)
+        filled.append(line)
+    return ''.join(filled)
+
+
+def _normalized_source_hash(source: str) -> str:
+    """
+    Hash a contract by its AST, ignoring comments, formatting and the module docstring.
+
+    Saved contracts carry a per-file header docstring (timestamp, description), so
+    otherwise identical contracts only collide once it is stripped.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+    if ast.get_docstring(tree, clean=False) is not None:
+        tree.body = tree.body[1:]
+    normalized = ast.dump(tree, annotate_fields=False, include_attributes=False)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _compile_contract_source(source: str, mode: Mode = Mode.Application) -> Dict:
+    """Compile one contract's source; runs inside a batch worker process."""
+    try:
+        return {'success': True, 'teal': compile_pyteal_source(source, mode), 'error': None}
+    except SyntaxError as e:
+        return {'success': False, 'error': f'Syntax Error: {e}'}
+    except Exception as e:
+        return {'success': False, 'error': f'Compilation failed: {str(e)}'}
+
+
+def compile_contracts_batch(
+    contract_paths: Iterable[Path],
+    mode: Mode = Mode.Application,
+    max_workers: Optional[int] = None
+) -> Dict[str, Dict]:
+    """
+    Compile many saved PyTeal contracts in a single worker pool.
+
+    PyTeal compilation is CPU-bound pure Python, so contracts are spread across
+    processes and the interpreter/PyTeal import cost is paid once per worker
+    instead of once per contract. Workers are spawned rather than forked so
+    no PyTeal global state leaks in from the parent. Contracts with the same
+    normalized AST are compiled once and share the result.
+
+    Returns:
+        Dict mapping each path to a dict with 'success', 'teal', 'error'
+    """
+    results = {}
+    groups: Dict[str, list] = {}
+    sources: Dict[str, str] = {}
+    for path in map(str, contract_paths):
+        try:
+            source = Path(path).read_text(encoding='utf-8')
+        except OSError as e:
+            results[path] = {'success': False, 'error': f'Could not read contract: {e}'}
+            continue
+        digest = _normalized_source_hash(source)
+        groups.setdefault(digest, []).append(path)
+        sources.setdefault(digest, source)
+
+    if not groups:
+        return results
+
+    digests = list(groups)
+    workers = min(max_workers or os.cpu_count() or 1, len(digests))
+    spawn_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=spawn_context) as executor:
+        compiled = executor.map(
+            _compile_contract_source, [sources[d] for d in digests], [mode] * len(digests)
+        )
+        for digest, result in zip(digests, compiled):
+            for path in groups[digest]:
+                results[path] = result
+    return results
+
+
+def compile_saved_contracts(
+    contracts_dir: Path,
+    max_workers: Optional[int] = None
+) -> Dict[str, Dict]:
+    """
+    Compile every saved contract_*.py in one batch and write each TEAL beside it.
+
+    contract_X.py gets contract_X.teal; contracts that fail to compile are
+    reported in the results and get no file.
+    """
+    results = compile_contracts_batch(
+        sorted(Path(contracts_dir).glob('contract_*.py')), max_workers=max_workers
+    )
+    for path, result in results.items():
+        if result['success']:
+            Path(path).with_suffix('.teal').write_text(result['teal'], encoding='utf-8')
+    return results
+
 
 class AlgorandDeployer:
     """Secure deployment manager for Algorand TestNet."""
     
+    # Successful connection checks, shared by all deployers: {algod_address: monotonic time}
+    VERIFY_TTL_SECONDS = 30
+    _last_verified: Dict[str, float] = {}
+    # Distinct TEAL programs whose algod compile responses each deployer keeps
+    ALGOD_COMPILE_CACHE_SIZE = 128
+    
     def __init__(self):
         self.algod_token = os.getenv('ALGOD_TOKEN', 'a' * 64)
         self.algod_address = os.getenv('ALGOD_ADDRESS', 'https://testnet-api.algonode.cloud')
@@ -32,56 +406,45 @@ class AlgorandDeployer:
             self.algod_token,
             self.algod_address
         )
+        # sha256(TEAL) -> algod compile response, oldest first
+        self._algod_compiles = {}
         self._verify_connection()
     
     def _verify_connection(self):
-        """Test Algorand node connectivity."""
+        """Test Algorand node connectivity, at most once per TTL per node."""
+        last_verified = AlgorandDeployer._last_verified.get(self.algod_address)
+        if last_verified is not None and time.monotonic() - last_verified < self.VERIFY_TTL_SECONDS:
+            return
         try:
             status = self.algod_client.status()
+            AlgorandDeployer._last_verified[self.algod_address] = time.monotonic()
             logging.info(f"Connected to Algorand TestNet - Round: {status['last-round']}")
         except Exception as e:
             logging.error(f"Algorand connection failed: {e}")
             raise ConnectionError("Cannot connect to Algorand node")
     
-    def compile_pyteal_to_teal(self, pyteal_code: str, mode: Mode = Mode.Application) -> Dict:
+    def compile_pyteal_to_teal(
+        self,
+        pyteal_code: str,
+        mode: Mode = Mode.Application,
+        template_values: Optional[Dict] = None
+    ) -> Dict:
         """
         Compile PyTeal source to TEAL bytecode with validation.
         
+        template_values fills Tmpl.* placeholders (e.g. {'TMPL_OWNER1': address}).
+        
         Returns:
             Dict with 'success', 'teal', 'compiled', 'error'
         """
         try:
-            # Create temporary namespace for exec
-            namespace = {}
-            
-            # Execute PyTeal code to get program
-            exec(pyteal_code, namespace)
-            
-            # Look for approval_program or router
-            approval_program = None
-            for name in ['approval_program', 'router', 'app']:
-                if name in namespace:
-                    approval_program = namespace[name]
-                    break
-            
-            if approval_program is None:
-                # Try to find any Expr object
-                for obj in namespace.values():
-                    if hasattr(obj, '_class_') and 'pyteal' in str(type(obj)).lower():
-                        approval_program = obj
-                        break
-            
-            if approval_program is None:
-                return {
-                    'success': False,
-                    'error': 'No PyTeal program found. Ensure you define approval_program variable.'
-                }
-            
-            # Compile to TEAL
-            teal_code = compileTeal(approval_program, mode, version=8)
+            # Compile to TEAL (served from the disk cache on repeat compiles)
+            teal_code = fill_template_vars(
+                compile_pyteal_source(pyteal_code, mode), template_values
+            )
             
             # Compile TEAL to bytecode
-            compile_response = self.algod_client.compile(teal_code)
+            compile_response = self._compile_via_algod(teal_code)
             
             return {
                 'success': True,
@@ -93,16 +456,32 @@ class AlgorandDeployer:
             
         except SyntaxError as e:
             return {'success': False, 'error': f'Syntax Error: {e}'}
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             return {'success': False, 'error': f'Compilation failed: {str(e)}'}
     
+    def _compile_via_algod(self, teal_code: str) -> Dict:
+        """Compile TEAL on the node, reusing the response for TEAL seen before."""
+        key = hashlib.sha256(teal_code.encode('utf-8')).hexdigest()
+        compiled = self._algod_compiles.get(key)
+        if compiled is None:
+            response = self.algod_client.compile(teal_code)
+            compiled = {'result': response['result'], 'hash': response['hash']}
+            if len(self._algod_compiles) >= self.ALGOD_COMPILE_CACHE_SIZE:
+                self._algod_compiles.pop(next(iter(self._algod_compiles)))
+            self._algod_compiles[key] = compiled
+        # Callers get their own dict, so one cannot alter another's response
+        return dict(compiled)
+    
     def deploy_contract(
         self,
         approval_teal: str,
         clear_teal: str,
         sender_private_key: str,
         global_schema: StateSchema = StateSchema(num_uints=1, num_byte_slices=1),
-        local_schema: StateSchema = StateSchema(num_uints=0, num_byte_slices=0)
+        local_schema: StateSchema = StateSchema(num_uints=0, num_byte_slices=0),
+        approval_compiled: Optional[Dict] = None
     ) -> Dict:
         """
         Deploy smart contract to Algorand TestNet.
@@ -113,6 +492,44 @@ class AlgorandDeployer:
             sender_private_key: Private key for deployment account
             global_schema: Global state schema
             local_schema: Local state schema
+            approval_compiled: 'result'/'hash' from compile_pyteal_to_teal, to skip recompiling
+        
+        Returns:
+            Dict with app_id, txn_id, address
+        """
+        try:
+            # Compile programs
+            approval_compiled = approval_compiled or self._compile_via_algod(approval_teal)
+            clear_compiled = self._compile_via_algod(clear_teal)
+        except Exception as e:
+            logging.error(f"Deployment failed: {e}")
+            return {'success': False, 'error': str(e)}
+        
+        return self.deploy_program(
+            base64.b64decode(approval_compiled['result']),
+            base64.b64decode(clear_compiled['result']),
+            sender_private_key,
+            global_schema=global_schema,
+            local_schema=local_schema
+        )
+    
+    def deploy_program(
+        self,
+        approval_program: bytes,
+        clear_program: bytes,
+        sender_private_key: str,
+        global_schema: StateSchema = StateSchema(num_uints=1, num_byte_slices=1),
+        local_schema: StateSchema = StateSchema(num_uints=0, num_byte_slices=0)
+    ) -> Dict:
+        """
+        Deploy already-compiled program bytecode to Algorand TestNet.
+        
+        Args:
+            approval_program: Approval program bytecode
+            clear_program: Clear program bytecode
+            sender_private_key: Private key for deployment account
+            global_schema: Global state schema
+            local_schema: Local state schema
         
         Returns:
             Dict with app_id, txn_id, address
@@ -121,13 +538,6 @@ class AlgorandDeployer:
             # Derive address from private key
             sender_address = account.address_from_private_key(sender_private_key)
             
-            # Compile programs
-            approval_compiled = self.algod_client.compile(approval_teal)
-            clear_compiled = self.algod_client.compile(clear_teal)
-            
-            approval_program = base64.b64decode(approval_compiled['result'])
-            clear_program = base64.b64decode(clear_compiled['result'])
-            
             # Get suggested params
             params = self.algod_client.suggested_params()
             
@@ -170,7 +580,6 @@ class AlgorandDeployer:
     
     def _get_app_address(self, app_id: int) -> str:
         """Calculate application address from app ID."""
-        from algosdk.logic import get_application_address
         return get_application_address(app_id)
     
     def generate_test_account(self) -> Dict[str, str]:
@@ -193,9 +602,21 @@ class AlgorandDeployer:
         except Exception as e:
             logging.error(f"Balance check failed: {e}")
             return None
+    
+    def get_account_balances(
+        self,
+        addresses: Iterable[str],
+        max_workers: int = 8
+    ) -> Dict[str, Optional[int]]:
+        """Get balances for several accounts with concurrent account_info requests."""
+        addresses = list(dict.fromkeys(addresses))
+        if not addresses:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(addresses))) as pool:
+            return dict(zip(addresses, pool.map(self.get_account_balance, addresses)))
 
 
+@lru_cache(maxsize=None)
 def create_simple_clear_program() -> str:
-    """Generate minimal clear state program."""
-    from pyteal import Approve, compileTeal, Mode
-    return compileTeal(Approve(), Mode.Application, version=8)
\ No newline at end of file
+    """Generate minimal clear state program (compiled once per process)."""
+    return _compile_teal(Approve(), Mode.Application)
\ No newline at end of file
@@ -4,14 +4,53 @@ Web Interface with Streamlit
 """
 
 import streamlit as st
+import os
+import re
 import json
+import time
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from algorand_ai_contractor.core.ai_engine import ContractGenerator, explain_contract
-from algorand_ai_contractor.core.algorand_utils import AlgorandDeployer, create_simple_clear_program
+from algorand_ai_contractor.core.ai_engine import ContractGenerator, explain_batch, explain_contract
+from algorand_ai_contractor.core.algorand_utils import (
+    COMPILE_TIMEOUT_SECONDS,
+    AlgorandDeployer,
+    compile_saved_contracts,
+    create_simple_clear_program,
+    precompile_pyteal_source,
+)
 
 # Define outputs path
 GENERATED_CONTRACTS_PATH = Path(__file__).parent.parent.parent.parent / "outputs" / "contracts"
+# One JSONL history file per browser session, named by the `history` id kept in the page URL
+GENERATION_HISTORY_DIR = GENERATED_CONTRACTS_PATH.parent / "history"
+HISTORY_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# Static page text
+HEADER_MD = """
+*Algorand PyTeal Contract Generator* | Powered by GPT-4  
+Generate, validate, and deploy smart contracts using natural language.
+
+EU AI Act Tier 2 Compliant | IEEE EAD Aligned
+"""
+
+EXAMPLE_PROMPTS_MD = """
+**Simple Escrow:**
+- Create an escrow contract that holds funds until both buyer and seller confirm the transaction.
+
+**Token Voting:**
+- Build a voting contract where users lock tokens to vote on proposals with a 7-day deadline.
+
+**Time-Locked Vault:**
+- Design a vault that releases funds to a beneficiary only after a specified timestamp.
+
+**Multi-Signature Wallet:**
+- Create a 2-of-3 multi-signature wallet for secure fund management.
+"""
+
+FOOTER_CAPTION = "Built with ❤ | Algorand + Perplexity AI | IEEE EAD & EU AI Act Compliant"
 
 # Page configuration
 st.set_page_config(
@@ -21,38 +60,124 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Docstring header written above every saved contract
+CONTRACT_FILE_HEADER = (
+    '"""\n'
+    'AI-Generated Smart Contract\n'
+    'Generated: {generated}\n'
+    'Description: {description}\n'
+    '"""\n\n'
+)
+
+def _write_contract_file(contract_code: str, description: str, generated: datetime) -> Path:
+    """Write one contract with its header; the output directory must already exist."""
+    filepath = GENERATED_CONTRACTS_PATH / f"contract_{generated.strftime('%Y%m%d_%H%M%S')}.py"
+    with open(filepath, 'w', encoding='utf-8') as f:
+        header = CONTRACT_FILE_HEADER.format(
+            generated=generated.isoformat(), description=description
+        )
+        f.write(header + contract_code)
+    return filepath
+
 # Helper function to save contracts (defined BEFORE use)
-def save_contract_to_file(contract_code: str, description: str):
+def save_contract_to_file(contract_code: str, description: str, generated_at: datetime):
     """Save generated contract to smart_contracts/ai_generated/ folder."""
     try:
         GENERATED_CONTRACTS_PATH.mkdir(parents=True, exist_ok=True)
-        
-        filename = f"contract_{datetime.now().strftime('%Y%m%d_%H%M%S')}.py"
-        filepath = GENERATED_CONTRACTS_PATH / filename
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(f'"""\n')
-            f.write(f'AI-Generated Smart Contract\n')
-            f.write(f'Generated: {datetime.now().isoformat()}\n')
-            f.write(f'Description: {description}\n')
-            f.write(f'"""\n\n')
-            f.write(contract_code)
-        
-        return filepath
+        return _write_contract_file(contract_code, description, generated_at)
+    except Exception as e:
+        st.warning(f"Could not save to file: {e}")
+        return None
+
+def save_contracts_batch(entries) -> int:
+    """Save every history entry not yet on disk in one pass; returns the number written."""
+    pending = [entry for entry in entries if not entry.get('saved')]
+    if not pending:
+        return 0
+    try:
+        GENERATED_CONTRACTS_PATH.mkdir(parents=True, exist_ok=True)
+        for entry in pending:
+            _write_contract_file(
+                entry['result']['code'],
+                entry['description'],
+                datetime.fromisoformat(entry['timestamp'])
+            )
+            entry['saved'] = True
     except Exception as e:
         st.warning(f"Could not save to file: {e}")
+    return sum(1 for entry in pending if entry.get('saved'))
+
+def session_history_path() -> Path:
+    """This browser session's history file; its id is kept in the URL so a reload finds it again."""
+    history_id = st.query_params.get('history', '')
+    if not HISTORY_ID_PATTERN.fullmatch(history_id):
+        history_id = uuid.uuid4().hex
+        st.query_params['history'] = history_id
+    return GENERATION_HISTORY_DIR / f"{history_id}.jsonl"
+
+def _history_line(entry: dict) -> str:
+    """Serialize one entry; generated_at is a datetime and is rebuilt from 'timestamp' on load."""
+    record = dict(entry, result={k: v for k, v in entry['result'].items() if k != 'generated_at'})
+    return json.dumps(record) + '\n'
+
+def save_history_jsonl(path: Path, entry: dict) -> bool:
+    """Append one new history entry; returns whether it was written."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8', buffering=8192) as f:
+            f.write(_history_line(entry))
+        return True
+    except Exception as e:
+        st.warning(f"Could not record history: {e}")
+        return False
+
+def rewrite_history_jsonl(path: Path, entries: list) -> bool:
+    """Replace the file with the current entries, after their saved/analysis state changes."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(_history_line(entry) for entry in entries))
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        st.warning(f"Could not record history: {e}")
+        return False
+
+def _parse_history_line(line: str):
+    """Rebuild one entry, or None for a line that is torn or lacks the fields the UI reads."""
+    try:
+        entry = json.loads(line)
+        result = entry['result']
+        if not isinstance(entry['description'], str) or not isinstance(result['code'], str):
+            return None
+        result['generated_at'] = datetime.fromisoformat(entry['timestamp'])
+        return entry
+    except (ValueError, KeyError, TypeError):
         return None
 
+def load_history_jsonl(path: Path) -> list:
+    """Read every entry in one pass, skipping malformed records."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    return [entry for entry in map(_parse_history_line, lines) if entry is not None]
+
 # Initialize session state
+if 'history_path' not in st.session_state:
+    st.session_state.history_path = session_history_path()
 if 'generation_history' not in st.session_state:
-    st.session_state.generation_history = []
+    st.session_state.generation_history = load_history_jsonl(st.session_state.history_path)
 if 'current_contract' not in st.session_state:
     st.session_state.current_contract = None
 
 # Initialize components
 @st.cache_resource
-def init_generator():
-    return ContractGenerator(model="sonar", temperature=0.2)
+def init_generator(provider: str, model: str, temperature: float):
+    """One configured generator per sidebar setting, reused across reruns."""
+    return ContractGenerator(model=model, temperature=temperature, ai_provider=provider)
 
 @st.cache_resource
 def init_deployer():
@@ -62,17 +187,38 @@ def init_deployer():
         st.error(f"Algorand connection failed: {e}")
         return None
 
-generator = init_generator()
+@st.cache_resource
+def init_compile_executor():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix='ui-compile')
+
+@st.cache_resource
+def contracts_display_base() -> str:
+    """Resolve the "Saved to" prefix once per server instead of calling getcwd on every rerun."""
+    try:
+        return str(GENERATED_CONTRACTS_PATH.relative_to(Path.cwd()))
+    except ValueError:
+        return str(GENERATED_CONTRACTS_PATH)
+
 deployer = init_deployer()
+compile_executor = init_compile_executor()
+
+@st.cache_data(ttl=5, show_spinner=False)
+def fetch_node_status(algod_address: str) -> dict:
+    """Poll algod at most every 5 seconds, however often the script reruns."""
+    return deployer.algod_client.status()
+
+@st.fragment(run_every=5)
+def render_node_status():
+    """Refresh the connection badge on its own, without rerunning the page."""
+    try:
+        status = fetch_node_status(deployer.algod_address)
+        st.success(f"✅ TestNet Connected (Round {status['last-round']})")
+    except Exception:
+        st.error("❌ TestNet Offline")
 
 # Header
 st.title("🔗 AI-Powered Smart Contract Creator")
-st.markdown("""
-*Algorand PyTeal Contract Generator* | Powered by GPT-4  
-Generate, validate, and deploy smart contracts using natural language.
-
-EU AI Act Tier 2 Compliant | IEEE EAD Aligned
-""")
+st.markdown(HEADER_MD)
 
 # Sidebar
 with st.sidebar:
@@ -90,26 +236,43 @@ with st.sidebar:
         model_choice = st.selectbox("Model", ["gpt-4", "gpt-4-turbo"], index=0)
     
     temperature = st.slider("Temperature", 0.0, 0.5, 0.2, 0.05)
+    stream_output = st.toggle(
+        "Stream output", value=False, help="Show the response live as it is generated"
+    )
+    generator = init_generator(ai_provider, model_choice, temperature)
     
     st.subheader("Deployment")
     if deployer:
-        try:
-            status = deployer.algod_client.status()
-            st.success(f"✅ TestNet Connected (Round {status['last-round']})")
-        except:
-            st.error("❌ TestNet Offline")
+        render_node_status()
     
     st.divider()
     
     st.subheader("📊 Session Stats")
     st.metric("Contracts Generated", len(st.session_state.generation_history))
     
+    unsaved = sum(1 for entry in st.session_state.generation_history if not entry.get('saved'))
+    if unsaved and st.button(f"💾 Flush Session to Disk ({unsaved} unsaved)"):
+        history = st.session_state.generation_history
+        written = save_contracts_batch(history)
+        if written:
+            rewrite_history_jsonl(st.session_state.history_path, history)
+        st.success(f"Saved {written} contract(s)")
+    
+    if st.button("⚙ Compile Saved Contracts to TEAL"):
+        with st.spinner("Compiling saved contracts..."):
+            compiled = compile_saved_contracts(GENERATED_CONTRACTS_PATH)
+        failed = [Path(path).name for path, result in compiled.items() if not result['success']]
+        st.success(f"Wrote {len(compiled) - len(failed)} .teal file(s)")
+        if failed:
+            st.warning(f"Could not compile: {', '.join(failed)}")
+    
     if st.button("🗑 Clear History"):
         st.session_state.generation_history = []
+        st.session_state.history_path.unlink(missing_ok=True)
         st.session_state.current_contract = None
         st.rerun()
 
-# Main tabs
+# Main tabs; Explain, Deploy and History are fragments, so their widgets rerun only their own tab
 tab1, tab2, tab3, tab4 = st.tabs(["🎨 Generate", "🔍 Explain", "🚀 Deploy", "📜 History"])
 
 # TAB 1: Generate Contract
@@ -118,19 +281,7 @@ with tab1:
     
     # Example templates
     with st.expander("📝 Example Prompts"):
-        st.markdown("""
-        **Simple Escrow:**
-        - Create an escrow contract that holds funds until both buyer and seller confirm the transaction.
-        
-        **Token Voting:**
-        - Build a voting contract where users lock tokens to vote on proposals with a 7-day deadline.
-        
-        **Time-Locked Vault:**
-        - Design a vault that releases funds to a beneficiary only after a specified timestamp.
-        
-        **Multi-Signature Wallet:**
-        - Create a 2-of-3 multi-signature wallet for secure fund management.
-        """)
+        st.markdown(EXAMPLE_PROMPTS_MD)
     
     # Input form
     user_description = st.text_area(
@@ -142,32 +293,67 @@ with tab1:
     col1, col2 = st.columns([1, 4])
     with col1:
         generate_button = st.button("⚡ Generate Contract", type="primary", use_container_width=True)
+    with col2:
+        # History is always recorded; a standalone .py per contract is opt-in
+        save_py_file = st.checkbox("Also save each contract as a .py file", value=False)
+        regenerate = st.checkbox(
+            "Ignore cached result (regenerate)",
+            value=False,
+            help="Ask the AI again even if this description was generated before"
+        )
+        precompile = st.checkbox(
+            "Precompile in the background",
+            value=False,
+            help="Runs the generated code right away in a worker process so Compile is instant"
+        )
     
     if generate_button and user_description:
-        with st.spinner("🤖 AI is crafting your contract..."):
-            result = generator.generate_pyteal_contract(
-                user_description,
-                ai_provider=ai_provider,
-                model=model_choice
-            )
+        if stream_output:
+            # Show tokens as they arrive, then validate the complete response
+            try:
+                with st.chat_message("assistant"):
+                    raw_output = st.write_stream(generator.stream_pyteal_contract(user_description))
+                result = generator.finalize_streamed_contract(user_description, raw_output)
+            except Exception as e:
+                # Auth, rate-limit and network errors are reported like the non-streamed path's
+                result = {'success': False, 'error': str(e), 'partial_code': None}
+        else:
+            with st.spinner("🤖 AI is crafting your contract..."):
+                # Candidate completions race in parallel; the first valid one wins
+                result = asyncio.run(generator.agenerate_pyteal_contract(
+                    user_description, use_cache=not regenerate
+                ))
+        
+        if result['success']:
+            # Stamp once; the saved file, history and download name all reuse it
+            generated_at = datetime.now()
+            result['generated_at'] = generated_at
+            result['filename_stamp'] = generated_at.strftime('%Y%m%d_%H%M%S')
+            st.session_state.current_contract = result
             
-            if result['success']:
-                st.session_state.current_contract = result
-                st.session_state.generation_history.append({
-                    'timestamp': datetime.now().isoformat(),
-                    'description': user_description,
-                    'result': result
-                })
-                
-                # Save to smart_contracts/ai_generated/
-                saved_path = save_contract_to_file(result['code'], user_description)
-                
-                st.success(f"✅ Contract generated in {result['metadata']['attempts']} attempt(s)")
-                if saved_path:
-                    st.info(f"📁 Saved to: `{saved_path.relative_to(Path.cwd())}`")
-            else:
-                st.error(f"❌ Generation failed: {result['error']}")
-                st.stop()
+            saved_path = None
+            if save_py_file:
+                saved_path = save_contract_to_file(result['code'], user_description, generated_at)
+            
+            entry = {
+                'timestamp': generated_at.isoformat(),
+                'description': user_description,
+                'result': result,
+                'saved': saved_path is not None
+            }
+            st.session_state.generation_history.append(entry)
+            save_history_jsonl(st.session_state.history_path, entry)
+            
+            if precompile:
+                # Warm the TEAL cache so the Compile step is instant
+                precompile_pyteal_source(result['code'])
+            
+            st.success(f"✅ Contract generated in {result['metadata']['attempts']} attempt(s)")
+            if saved_path:
+                st.info(f"📁 Saved to: `{contracts_display_base()}/{saved_path.name}`")
+        else:
+            st.error(f"❌ Generation failed: {result['error']}")
+            st.stop()
     
     # Display current contract
     if st.session_state.current_contract and st.session_state.current_contract['success']:
@@ -185,13 +371,16 @@ with tab1:
             st.download_button(
                 label="💾 Download PyTeal Code",
                 data=contract['code'],
-                file_name=f"contract_{datetime.now().strftime('%Y%m%d_%H%M%S')}.py",
+                file_name=f"contract_{contract['filename_stamp']}.py",
                 mime="text/x-python"
             )
         
         with col2:
-            # Show saved location
-            st.info(f"📁 Auto-saved to: `smart_contracts/ai_generated/`")
+            # Show where the session history is recorded
+            st.info(
+                f"📁 Recorded in: `history/{st.session_state.history_path.name}` "
+                "(reopen this URL to reload it)"
+            )
         
         # Explanation
         with st.expander("📖 Contract Explanation", expanded=True):
@@ -206,7 +395,8 @@ with tab1:
             st.markdown(contract['audit'] or "No audit information provided")
 
 # TAB 2: Explain Contract
-with tab2:
+@st.fragment
+def render_explain_tab():
     st.header("Explain Existing Contract")
     
     existing_code = st.text_area(
@@ -224,29 +414,65 @@ with tab2:
         else:
             st.warning("Please provide PyTeal code to analyze")
 
+with tab2:
+    render_explain_tab()
+
 # TAB 3: Deploy Contract
-with tab3:
+@st.fragment
+def render_deploy_tab():
     st.header("Deploy to Algorand TestNet")
     
     if not deployer:
         st.error("⚠ Algorand deployer not initialized. Check your .env configuration.")
-        st.stop()
+        return
     
     if not st.session_state.current_contract:
         st.info("👈 Generate a contract first in the Generate tab")
-        st.stop()
+        return
     
     st.subheader("Step 1: Compile Contract")
     
+    contract_code = st.session_state.current_contract['code']
+    template_values = {}
+    if 'TMPL_' in contract_code:
+        template_input = st.text_area(
+            "Template Values:",
+            placeholder="TMPL_OWNER1=ADDRESS...\nTMPL_DURATION=604800",
+            help="One NAME=value per line for the contract's Tmpl.* placeholders"
+        )
+        for line in template_input.splitlines():
+            name, sep, value = line.partition('=')
+            if sep:
+                # Typed against each placeholder's TEAL type when the TEAL is filled in
+                template_values[name.strip()] = value.strip()
+    
     if st.button("⚙ Compile to TEAL"):
         with st.spinner("Compiling..."):
-            contract_code = st.session_state.current_contract['code']
-            compile_result = deployer.compile_pyteal_to_teal(contract_code)
+            # Compile off the script thread; polling keeps the session able to rerun or stop
+            future = compile_executor.submit(
+                deployer.compile_pyteal_to_teal, contract_code, template_values=template_values
+            )
+            elapsed = st.empty()
+            started = time.monotonic()
+            while not future.done():
+                waited = time.monotonic() - started
+                if waited > COMPILE_TIMEOUT_SECONDS:
+                    elapsed.empty()
+                    st.error(f"❌ Compilation timed out after {COMPILE_TIMEOUT_SECONDS}s")
+                    st.stop()
+                elapsed.caption(f"{waited:.1f}s elapsed")
+                time.sleep(0.1)
+            elapsed.empty()
+            compile_result = future.result()
             
             if compile_result['success']:
                 st.success("✅ Compilation successful!")
                 st.session_state['compiled_teal'] = compile_result['teal']
                 st.session_state['compiled_hash'] = compile_result['hash']
+                st.session_state['compiled_program'] = {
+                    'result': compile_result['compiled'],
+                    'hash': compile_result['hash']
+                }
                 
                 with st.expander("View TEAL Code"):
                     st.code(compile_result['teal'], language='teal')
@@ -282,7 +508,8 @@ with tab3:
                     deploy_result = deployer.deploy_contract(
                         approval_teal=st.session_state['compiled_teal'],
                         clear_teal=clear_program,
-                        sender_private_key=private_key
+                        sender_private_key=private_key,
+                        approval_compiled=st.session_state.get('compiled_program')
                     )
                     
                     if deploy_result['success']:
@@ -292,18 +519,41 @@ with tab3:
                     else:
                         st.error(f"Deployment failed: {deploy_result['error']}")
 
+with tab3:
+    render_deploy_tab()
+
 # TAB 4: History
-with tab4:
+@st.fragment
+def render_history_tab():
     st.header("Generation History")
     
     if not st.session_state.generation_history:
         st.info("No contracts generated yet")
     else:
-        for idx, entry in enumerate(reversed(st.session_state.generation_history)):
-            with st.expander(f"Contract #{len(st.session_state.generation_history) - idx} - {entry['timestamp'][:19]}"):
+        if st.button("🔄 Re-analyze All"):
+            history = st.session_state.generation_history
+            with st.spinner(f"Analyzing {len(history)} contract(s)..."):
+                analyses = asyncio.run(explain_batch(
+                    [entry['result']['code'] for entry in history],
+                    ai_provider=ai_provider
+                ))
+            for entry, analysis in zip(history, analyses):
+                entry['analysis'] = analysis
+            rewrite_history_jsonl(st.session_state.history_path, history)
+        
+        history = st.session_state.generation_history
+        for i in range(len(history) - 1, -1, -1):
+            entry = history[i]
+            with st.expander(f"Contract #{i + 1} - {entry['timestamp'][:19]}"):
                 st.markdown(f"*Description:* {entry['description']}")
                 st.code(entry['result']['code'], language='python')
+                if entry.get('analysis'):
+                    st.markdown("*Analysis:*")
+                    st.markdown(entry['analysis'])
+
+with tab4:
+    render_history_tab()
 
 # Footer
 st.divider()
-st.caption("Built with ❤ | Algorand + Perplexity AI | IEEE EAD & EU AI Act Compliant")
\ No newline at end of file
+st.caption(FOOTER_CAPTION)
\ No newline at end of file
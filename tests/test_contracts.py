@@ -3,17 +3,84 @@ Pytest test suite for contract generation and deployment
 """
 
 import pytest
+import asyncio
+from types import SimpleNamespace
+from algorand_ai_contractor.core import ai_engine, algorand_utils
 from algorand_ai_contractor.core.ai_engine import ContractGenerator
 from algorand_ai_contractor.core.algorand_utils import AlgorandDeployer
+from algorand_ai_contractor.contracts.templates import asa_deposit_checks, safety_checks
 
 @pytest.fixture
 def generator():
     return ContractGenerator(temperature=0.2)
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def deployer():
+    # Connects to algod once for the whole run, and only when a test asks for it
     return AlgorandDeployer()
 
+class FakeCompletions:
+    """Stand-in for client.chat.completions that records each API call."""
+
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if kwargs.get('stream'):
+            self.stream = FakeStream(self.content)
+            return self.stream
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+class FakeStream:
+    """Streamed completion yielding the content in small deltas."""
+
+    def __init__(self, content, size=8):
+        self.pieces = [content[i:i + size] for i in range(0, len(content), size)]
+        self.yielded = 0
+        self.closed = False
+
+    def __iter__(self):
+        for piece in self.pieces:
+            if self.closed:
+                return
+            self.yielded += 1
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    def close(self):
+        self.closed = True
+
+class FakeAsyncClient:
+    """Stand-in for AsyncOpenAI that routes completions to `create` and records closing."""
+
+    def __init__(self, create):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+@pytest.fixture
+def fake_completions(generator, tmp_path, monkeypatch):
+    """Route generator API calls to a canned, valid contract response."""
+    monkeypatch.setattr(ai_engine, 'PROMPT_CACHE_PATH', tmp_path)
+    completions = FakeCompletions(
+        "```python\nfrom pyteal import *\napproval_program = Approve()\n```\nAlways approves."
+    )
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(generator, '_get_client', lambda provider: client)
+    return completions
+
+@pytest.mark.network
 def test_simple_escrow_generation(generator):
     """Test generation of simple escrow contract."""
     description = "Create an escrow contract that releases funds when both parties agree"
@@ -23,6 +90,7 @@ def test_simple_escrow_generation(generator):
     assert 'pyteal' in result['code'].lower()
     assert len(result['code']) > 100
 
+@pytest.mark.network
 def test_compilation_validation(generator, deployer):
     """Test PyTeal compilation pipeline."""
     description = "Create a contract that always approves"
@@ -40,6 +108,241 @@ def test_dangerous_pattern_rejection(generator):
     validation = generator._validate_pyteal_syntax(dangerous_code)
     assert validation['valid'] is False
 
+@pytest.mark.parametrize('line', [
+    "eval('1')",
+    "import subprocess",
+    "from os import system",
+    "__import__('os')",
+])
+def test_dangerous_code_in_valid_contract_is_rejected(generator, line):
+    """Calls and imports outside PyTeal are rejected even in otherwise valid contracts."""
+    code = f"from pyteal import *\n{line}\napproval_program = Approve()\n"
+    validation = generator._validate_pyteal_syntax(code)
+    assert validation['valid'] is False
+    assert 'disallowed' in validation['error'].lower()
+
+def test_main_guard_is_not_checked(generator):
+    """The usual `write approval.teal` ending never runs under exec, so it is allowed."""
+    code = (
+        "from pyteal import *\n"
+        "approval_program = Approve()\n"
+        "if __name__ == \"__main__\":\n"
+        "    with open(\"approval.teal\", \"w\") as f:\n"
+        "        f.write(compileTeal(approval_program, Mode.Application, version=8))\n"
+    )
+    assert generator._validate_pyteal_syntax(code)['valid'] is True
+
+    prompt = generator.SYSTEM_PROMPT
+    banned = ai_engine.DANGEROUS_CALLS | ai_engine.DANGEROUS_MODULES
+    assert all(f"`{name}`" in prompt for name in banned)
+
+def test_python_block_is_found_after_other_fences(generator):
+    """A shell block before the contract does not hide or truncate the Python block."""
+    raw = (
+        "Install first:\n```bash\npip install pyteal\n```\nCode:\n"
+        "```python\nfrom pyteal import *\napproval_program = Approve()\n```\nDone."
+    )
+    parsed = generator._parse_ai_response(raw)
+    assert parsed['code'] == "from pyteal import *\napproval_program = Approve()\n"
+    assert 'pip install pyteal' in parsed['explanation']
+
+    unlabeled = raw.replace("```python", "```")
+    assert generator._parse_ai_response(unlabeled)['code'] == parsed['code']
+
+def test_syntax_error_rejection(generator):
+    """Code that does not parse is sent back for self-correction."""
+    broken_code = "from pyteal import *\napproval_program = Seq([x = Int(1), Approve()])"
+    validation = generator._validate_pyteal_syntax(broken_code)
+    assert validation['valid'] is False
+    assert 'syntax error' in validation['error'].lower()
+
+def test_generation_is_served_from_prompt_cache(generator, fake_completions):
+    """Repeating a request returns the cached result without an API call."""
+    first = generator.generate_pyteal_contract("Create a contract that always approves")
+    second = generator.generate_pyteal_contract("Create a contract that always approves")
+
+    assert fake_completions.calls == 1
+    assert second['code'] == first['code']
+    assert second['metadata']['cached'] is True
+
+def test_prompt_cache_ignores_whitespace_but_not_case(generator, fake_completions):
+    """Requests differing only in spacing share a cache entry; case differences do not."""
+    generator.generate_pyteal_contract("Create a contract with key Votes")
+    repeat = generator.generate_pyteal_contract("  Create a contract\nwith key   Votes ")
+    assert fake_completions.calls == 1
+    assert repeat['metadata']['cached'] is True
+
+    generator.generate_pyteal_contract("Create a contract with key votes")
+    assert fake_completions.calls == 2
+
+def test_async_generation_takes_first_valid_attempt(generator, tmp_path, monkeypatch):
+    """Parallel attempts stop at the first response that validates."""
+    monkeypatch.setattr(ai_engine, 'PROMPT_CACHE_PATH', tmp_path)
+    temperatures = []
+
+    async def create(**kwargs):
+        temperatures.append(kwargs['temperature'])
+        content = "no code here" if len(temperatures) == 1 else (
+            "```python\nfrom pyteal import *\napproval_program = Approve()\n```"
+        )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    client = FakeAsyncClient(create)
+    monkeypatch.setattr(generator, '_get_async_client', lambda provider: client)
+
+    result = asyncio.run(generator.agenerate_pyteal_contract("Always approve", max_retries=3))
+
+    assert result['success'] is True
+    assert result['metadata']['attempts'] == 2
+    assert len(set(temperatures)) == len(temperatures)
+    assert client.closed is True
+
+def test_async_generation_bounds_concurrent_requests(generator, tmp_path, monkeypatch):
+    """No more than max_concurrent attempts are in flight at once."""
+    monkeypatch.setattr(ai_engine, 'PROMPT_CACHE_PATH', tmp_path)
+    in_flight = []
+    peak = []
+
+    async def create(**kwargs):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        message = SimpleNamespace(content="no code")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    client = FakeAsyncClient(create)
+    monkeypatch.setattr(generator, '_get_async_client', lambda provider: client)
+
+    result = asyncio.run(
+        generator.agenerate_pyteal_contract("Never valid", max_retries=6, max_concurrent=2)
+    )
+
+    assert result['success'] is False
+    assert len(peak) == 6
+    assert max(peak) == 2
+
+def test_api_client_is_shared_per_provider(generator, monkeypatch):
+    """Calls reuse one client (and its connection pool) per provider."""
+    monkeypatch.setattr(ai_engine, 'OPENAI_API_KEY', 'test-key')
+    ai_engine._shared_client.cache_clear()
+    try:
+        assert generator._get_client('openai') is generator._get_client('openai')
+        assert generator._get_client('openai') is ai_engine._shared_client('openai')
+    finally:
+        ai_engine._shared_client.cache_clear()
+
+def test_generator_defaults_come_from_constructor(tmp_path, monkeypatch):
+    """A generator built for one provider and model uses them without per-call overrides."""
+    monkeypatch.setattr(ai_engine, 'PROMPT_CACHE_PATH', tmp_path)
+    generator = ContractGenerator(model='gpt-4o', temperature=0.4, ai_provider='openai')
+    completions = FakeCompletions(
+        "```python\nfrom pyteal import *\napproval_program = Approve()\n```"
+    )
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    requested = []
+    monkeypatch.setattr(
+        generator, '_get_client', lambda provider: requested.append(provider) or client
+    )
+
+    result = generator.generate_pyteal_contract("Create a contract that always approves")
+
+    assert requested == ['openai']
+    assert result['metadata']['provider'] == 'openai'
+    assert result['metadata']['model'] == 'gpt-4o'
+
+def test_async_client_falls_back_without_aiohttp(monkeypatch):
+    """Without the aiohttp extra, async clients use openai's default transport."""
+    def missing_extra():
+        raise RuntimeError("aiohttp extra not installed")
+    monkeypatch.setattr(ai_engine, 'OPENAI_API_KEY', 'test-key')
+    monkeypatch.setattr('openai.DefaultAioHttpClient', missing_extra)
+
+    assert ai_engine._async_http_client() is None
+    assert isinstance(ai_engine._new_async_client('openai'), ai_engine.AsyncOpenAI)
+
+def test_token_bucket_refills_over_time():
+    """Calls beyond the per-minute token budget wait until it refills."""
+    bucket = ai_engine._TokenBucket(rpm=None, tpm=600)
+    assert bucket._try_take(600)
+    assert not bucket._try_take(50)
+
+    bucket._updated -= 6  # six seconds at 600 TPM refill 60 tokens
+    assert bucket._try_take(50)
+
+def test_unset_rate_limits_do_not_throttle():
+    """Without ALGO_AI_RPM/ALGO_AI_TPM, acquiring never waits."""
+    bucket = ai_engine._TokenBucket(rpm=None, tpm=None)
+    asyncio.run(asyncio.wait_for(bucket.acquire(10_000), timeout=1))
+
+def test_async_transport_closes_with_its_client(monkeypatch):
+    """The per-client HTTP session is closed when its AsyncOpenAI client is."""
+    import openai
+    transports = []
+
+    def transport():
+        transports.append(openai.DefaultAsyncHttpxClient())
+        return transports[-1]
+    monkeypatch.setattr(ai_engine, 'OPENAI_API_KEY', 'test-key')
+    monkeypatch.setattr('openai.DefaultAioHttpClient', transport)
+
+    async def open_and_close():
+        async with ai_engine._new_async_client('openai'):
+            pass
+    asyncio.run(open_and_close())
+
+    assert len(transports) == 1
+    assert transports[0].is_closed
+
+@pytest.mark.parametrize('provider, requested, expected', [
+    ('perplexity', 'sonar-pro', 'sonar-pro'),
+    ('perplexity', 'gpt-4o', 'sonar'),
+    ('openai', 'gpt-4o', 'gpt-4o'),
+    ('openai', 'sonar', 'gpt-4'),
+])
+def test_model_selection_per_provider(generator, provider, requested, expected):
+    """Unsupported model names fall back to the provider's default."""
+    assert generator._get_model(provider, requested) == expected
+
+def test_invalid_code_block_stops_stream_early(generator, fake_completions):
+    """A failing code block aborts the stream instead of reading the prose after it."""
+    fake_completions.content = "```python\nx = 1\n```\n" + "Explanation. " * 50
+    result = generator.generate_pyteal_contract("Broken", max_retries=1, use_cache=False)
+
+    assert result['success'] is False
+    assert fake_completions.stream.closed is True
+    assert fake_completions.stream.yielded < len(fake_completions.stream.pieces)
+
+def test_explain_batch_keeps_input_order(tmp_path, monkeypatch):
+    """Concurrent explanations come back aligned with the codes passed in."""
+    monkeypatch.setattr(ai_engine, 'PROMPT_CACHE_PATH', tmp_path)
+
+    async def create(**kwargs):
+        code = kwargs['messages'][1]['content']
+        await asyncio.sleep(0.02 if 'first' in code else 0)
+        content = 'explains first' if 'first' in code else 'explains second'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    client = FakeAsyncClient(create)
+    monkeypatch.setattr(ai_engine, '_new_async_client', lambda provider: client)
+
+    explanations = asyncio.run(
+        ai_engine.explain_batch(['# first', '# second'], ai_provider='openai')
+    )
+    assert explanations == ['explains first', 'explains second']
+    assert client.closed is True
+
+def test_streamed_contract_is_validated_after_display(generator, fake_completions):
+    """Streamed text joins back into the response and validates like a normal generation."""
+    raw_output = ''.join(generator.stream_pyteal_contract("Always approve"))
+    assert raw_output == fake_completions.content
+
+    result = generator.finalize_streamed_contract("Always approve", raw_output)
+    assert result['success'] is True
+    assert 'approval_program' in result['code']
+    assert generator.generate_pyteal_contract("Always approve")['metadata']['cached'] is True
+
+@pytest.mark.network
 def test_retry_mechanism(generator):
     """Test self-correction on invalid code."""
     # Force a scenario that might need retry
@@ -48,4 +351,246 @@ def test_retry_mechanism(generator):
     
     # Should either succeed or fail gracefully
     assert 'success' in result
-    assert 'metadata' in result or 'error' in result
\ No newline at end of file
+    assert 'metadata' in result or 'error' in result
+
+def test_teal_cache_reuses_compiled_output(tmp_path, monkeypatch):
+    """Repeat compiles of identical source are served from the TEAL cache."""
+    monkeypatch.setattr(algorand_utils, 'TEAL_CACHE_PATH', tmp_path)
+    source = "from pyteal import *\napproval_program = Approve()\n"
+
+    algorand_utils.compile_pyteal_source.cache_clear()
+
+    teal = algorand_utils.compile_pyteal_source(source)
+    cached_files = list(tmp_path.glob('*.teal'))
+    assert len(cached_files) == 1
+
+    # In-process hits skip even the file read
+    cached_files[0].write_text(teal + '// cached\n', encoding='utf-8')
+    assert algorand_utils.compile_pyteal_source(source) == teal
+
+    # A fresh process must not recompile, so the tampered entry is returned verbatim
+    algorand_utils.compile_pyteal_source.cache_clear()
+    assert algorand_utils.compile_pyteal_source(source).endswith('// cached\n')
+
+
+def test_teal_cache_key_tracks_shared_templates(tmp_path, monkeypatch):
+    """Editing a shared guard invalidates TEAL compiled against the old version."""
+    from pyteal import Mode
+
+    (tmp_path / 'common.py').write_text("FEE = 1000\n", encoding='utf-8')
+    monkeypatch.setattr(algorand_utils, 'TEMPLATES_PATH', tmp_path)
+    key_args = ("from pyteal import *\napproval_program = Approve()\n", Mode.Application, 8)
+
+    algorand_utils._templates_fingerprint.cache_clear()
+    before = algorand_utils._teal_cache_key(*key_args)
+    (tmp_path / 'common.py').write_text("FEE = 2000\n", encoding='utf-8')
+    algorand_utils._templates_fingerprint.cache_clear()
+    after = algorand_utils._teal_cache_key(*key_args)
+    algorand_utils._templates_fingerprint.cache_clear()
+
+    assert before != after
+
+
+def test_precompile_runs_outside_the_compile_lock(tmp_path, monkeypatch):
+    """Precompiles run in a worker process, and lock waits give up instead of hanging."""
+    monkeypatch.setattr(algorand_utils, 'TEAL_CACHE_PATH', tmp_path)
+    monkeypatch.setattr(algorand_utils, 'COMPILE_TIMEOUT_SECONDS', 0.05)
+    source = "from pyteal import *\napproval_program = Approve()  # precompiled\n"
+    algorand_utils.compile_pyteal_source.cache_clear()
+
+    with algorand_utils._COMPILE_LOCK:
+        algorand_utils.precompile_pyteal_source(source).result(timeout=60)
+        assert len(list(tmp_path.glob('*.teal'))) == 1
+        with pytest.raises(TimeoutError):
+            algorand_utils.compile_pyteal_source(source.replace('Approve', 'Reject'))
+
+    assert algorand_utils.compile_pyteal_source(source).startswith('#pragma version')
+
+
+def test_batch_compile_reports_per_contract_results(tmp_path, monkeypatch):
+    """Batch compilation returns one result per contract, including failures."""
+    monkeypatch.setattr(algorand_utils, 'TEAL_CACHE_PATH', tmp_path)
+    monkeypatch.setenv('TEAL_CACHE_DIR', str(tmp_path))
+    valid = tmp_path / 'contract_valid.py'
+    valid.write_text("from pyteal import *\napproval_program = Approve()\n", encoding='utf-8')
+    duplicate = tmp_path / 'contract_duplicate.py'
+    duplicate.write_text(
+        '"""Saved later."""\nfrom pyteal import *\n\napproval_program = Approve()  # same\n',
+        encoding='utf-8'
+    )
+    broken = tmp_path / 'contract_broken.py'
+    broken.write_text("approval_program = (", encoding='utf-8')
+
+    results = algorand_utils.compile_contracts_batch([valid, duplicate, broken], max_workers=2)
+
+    assert results[str(valid)]['success'] is True
+    assert '#pragma version' in results[str(valid)]['teal']
+    assert results[str(duplicate)] is results[str(valid)]
+    assert results[str(broken)]['success'] is False
+
+    saved = algorand_utils.compile_saved_contracts(tmp_path, max_workers=2)
+    assert set(saved) == {str(valid), str(duplicate), str(broken)}
+    written = (tmp_path / 'contract_valid.teal').read_text(encoding='utf-8')
+    assert written == results[str(valid)]['teal']
+    assert not (tmp_path / 'contract_broken.teal').exists()
+
+
+@pytest.mark.parametrize('source', [
+    "from pyteal import *\napproval_program = Approve()\n",
+    "from pyteal import *\ndef approval_program():\n    return Approve()\n",
+    "from pyteal import *\n"
+    "router = Router('noop', BareCallActions(no_op=OnCompleteAction.always(Approve())))\n",
+])
+def test_program_is_resolved_from_known_names(source, tmp_path, monkeypatch):
+    """Expressions, program functions and routers all compile to TEAL v8."""
+    monkeypatch.setattr(algorand_utils, 'TEAL_CACHE_PATH', tmp_path)
+    teal = algorand_utils.compile_pyteal_source(source)
+    assert teal.startswith('#pragma version 8')
+
+
+def test_source_without_named_program_is_rejected(tmp_path, monkeypatch):
+    """Stray PyTeal expressions are not mistaken for the approval program."""
+    monkeypatch.setattr(algorand_utils, 'TEAL_CACHE_PATH', tmp_path)
+    with pytest.raises(ValueError, match='No PyTeal program found'):
+        algorand_utils.compile_pyteal_source("from pyteal import *\nKEY = Bytes('k')\n")
+
+
+def test_template_values_fill_compiled_teal(tmp_path, monkeypatch):
+    """Tmpl placeholders stay in the cached TEAL and are filled per deployment."""
+    monkeypatch.setattr(algorand_utils, 'TEAL_CACHE_PATH', tmp_path)
+    owner = "7ZUECA7HFLZTXENRV24SHLU4AVPUTMTTDUFUBNBD64C73F3UHRTHAIOF6Q"
+    source = (
+        "from pyteal import *\n"
+        "approval_program = Seq(Assert(Txn.sender() == Tmpl.Addr('TMPL_OWNER')),"
+        " Assert(Global.latest_timestamp() < Tmpl.Int('TMPL_DEADLINE')), Approve())\n"
+    )
+    teal = algorand_utils.compile_pyteal_source(source)
+    assert 'TMPL_OWNER' in teal and 'TMPL_DEADLINE' in teal
+
+    filled = algorand_utils.fill_template_vars(
+        teal, {'TMPL_OWNER': owner, 'TMPL_DEADLINE': 1700000000}
+    )
+    assert 'TMPL_' not in filled
+    assert '0x' + algorand_utils.encoding.decode_address(owner).hex() in filled
+    assert 'pushint 1700000000' in filled
+
+    with pytest.raises(ValueError, match='TMPL_DEADLINE'):
+        algorand_utils.fill_template_vars(teal, {'TMPL_OWNER': owner})
+
+def test_template_values_follow_placeholder_types():
+    """Values are typed by the opcode loading each placeholder, and mismatches are rejected."""
+    teal = "#pragma version 8\npushint TMPL_AMOUNT\npushbytes TMPL_NOTE\naddr TMPL_OWNER\n"
+    owner = "7ZUECA7HFLZTXENRV24SHLU4AVPUTMTTDUFUBNBD64C73F3UHRTHAIOF6Q"
+
+    filled = algorand_utils.fill_template_vars(
+        teal, {'TMPL_AMOUNT': '1000', 'TMPL_NOTE': '1000', 'TMPL_OWNER': owner}
+    )
+    assert filled.splitlines()[1:] == [
+        'pushint 1000',
+        'pushbytes 0x31303030',
+        'byte 0x' + algorand_utils.encoding.decode_address(owner).hex(),
+    ]
+
+    for bad in ({'TMPL_AMOUNT': '-1'}, {'TMPL_AMOUNT': ' 1000'}, {'TMPL_NOTE': 1000}):
+        values = dict({'TMPL_AMOUNT': 1, 'TMPL_NOTE': 'x', 'TMPL_OWNER': owner}, **bad)
+        with pytest.raises(ValueError, match=next(iter(bad))):
+            algorand_utils.fill_template_vars(teal, values)
+
+
+def test_algod_compile_responses_are_reused():
+    """Identical TEAL is sent to algod once per deployer."""
+    calls = []
+
+    def compile(teal):
+        calls.append(teal)
+        return {'result': 'AQ==', 'hash': 'HASH'}
+
+    deployer = AlgorandDeployer.__new__(AlgorandDeployer)
+    deployer.algod_client = SimpleNamespace(compile=compile)
+    deployer._algod_compiles = {}
+    teal = "#pragma version 8\npushint 1\nreturn\n"
+
+    first = deployer._compile_via_algod(teal)
+    assert first == {'result': 'AQ==', 'hash': 'HASH'}
+    first['result'] = 'changed'
+    assert deployer._compile_via_algod(teal) == {'result': 'AQ==', 'hash': 'HASH'}
+    assert calls == [teal]
+
+
+def test_clear_program_is_compiled_once(monkeypatch):
+    """The constant clear program skips PyTeal after the first call."""
+    clear_teal = algorand_utils.create_simple_clear_program()
+    monkeypatch.setattr(algorand_utils, '_compile_teal', None)
+    assert algorand_utils.create_simple_clear_program() == clear_teal
+
+
+def test_connection_check_is_skipped_within_ttl(monkeypatch):
+    """Deployers for the same node reuse a recent successful status probe."""
+    monkeypatch.setattr(AlgorandDeployer, '_last_verified', {})
+    probes = []
+    deployer = AlgorandDeployer.__new__(AlgorandDeployer)
+    deployer.algod_address = 'http://localhost:4001'
+    deployer.algod_client = SimpleNamespace(status=lambda: probes.append(1) or {'last-round': 1})
+
+    deployer._verify_connection()
+    deployer._verify_connection()
+    assert len(probes) == 1
+
+
+def test_account_balances_are_fetched_per_address():
+    """Each distinct address is looked up once; failures map to None."""
+    balances = {'ADDR1': 5, 'ADDR2': 7}
+
+    def account_info(address):
+        if address not in balances:
+            raise RuntimeError('unknown account')
+        return {'amount': balances[address]}
+
+    deployer = AlgorandDeployer.__new__(AlgorandDeployer)
+    deployer.algod_client = SimpleNamespace(account_info=account_info)
+
+    result = deployer.get_account_balances(['ADDR1', 'ADDR2', 'ADDR1', 'MISSING'])
+    assert result == {'ADDR1': 5, 'ADDR2': 7, 'MISSING': None}
+
+
+def test_shared_safety_checks_are_reused():
+    """Shared guards are built once and compile inside a program."""
+    from pyteal import Approve, Mode, Seq, compileTeal
+
+    assert safety_checks() is safety_checks()
+    program = Seq(safety_checks(), safety_checks(), Approve())
+    teal = compileTeal(program, Mode.Application, version=8)
+    assert teal.count('RekeyTo') == 1
+    assert teal.count('callsub') == 2
+
+
+def test_safety_checks_accept_an_expression_fee_limit():
+    """A PyTeal fee limit is passed to the subroutine rather than wrapped in Int()."""
+    from pyteal import App, Approve, Bytes, Mode, Seq, compileTeal
+
+    program = Seq(safety_checks(App.globalGet(Bytes("max_fee"))), safety_checks(), Approve())
+    teal = compileTeal(program, Mode.Application, version=8)
+    assert 'app_global_get' in teal
+    assert teal.count('RekeyTo') == 2
+
+def test_generated_code_can_use_shared_guards(generator, tmp_path, monkeypatch):
+    """Contracts importing the shared guards, as the prompt suggests, validate and compile."""
+    monkeypatch.setattr(algorand_utils, 'TEAL_CACHE_PATH', tmp_path)
+    source = (
+        "from pyteal import Approve, Seq\n"
+        "from algorand_ai_contractor.contracts.templates import safety_checks\n"
+        "def approval_program():\n"
+        "    return Seq(safety_checks(), Approve())\n"
+    )
+    assert 'algorand_ai_contractor.contracts.templates' in generator.SYSTEM_PROMPT
+    assert generator._validate_pyteal_syntax(source)['valid'] is True
+    assert 'callsub safetychecks1000' in algorand_utils.compile_pyteal_source(source)
+
+def test_asa_deposit_checks_compile_once():
+    """The group guard is emitted once however many branches call it."""
+    from pyteal import Approve, Int, Mode, Seq, compileTeal
+
+    program = Seq(asa_deposit_checks(Int(7)), asa_deposit_checks(Int(7)), Approve())
+    teal = compileTeal(program, Mode.Application, version=8)
+    assert teal.count('XferAsset') == 1
+    assert teal.count('callsub') == 2